@@ -0,0 +1,394 @@
+"""
+Tempo analysis for uploaded songs.
+
+Two analysis profiles are available:
+
+  * "full" decodes the whole track at its native sample rate and runs
+    librosa's beat tracker over all of it. This is the original behaviour.
+  * "fast" decodes mono audio at 22050 Hz and only looks at a few sampled
+    windows of the track, merging their tempograms into one estimate. On long
+    mixes this cuts decode and onset time (and memory) by an order of
+    magnitude; see the README for the measured accuracy/speed tradeoff.
+  * "stream" reads the track in blocks and never holds the whole waveform,
+    so memory stays flat however long the mix is. It also reports tempo per
+    segment over time (see streaming.py).
+
+Any profile setting can be overridden per call, e.g. an explicit offset and
+duration to analyze a single excerpt.
+
+librosa loads its submodules (and scipy and numba with them) on first use, so
+importing this module is cheap. The first analysis in a process pays for
+those imports and for loading or compiling librosa's numba functions instead.
+warm_up() pays that up front.
+"""
+import io
+import os
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from analysis_cache import DEFAULT_CACHE_DIR, content_hash, make_key
+from audio_io import audio_buffer, audio_duration, decode_audio
+from features import SpectralStats, at_tempo, onset_envelope, tempo_candidates
+from fingerprint import query_landmarks, reference_landmarks
+from instrumentation import stage
+from streaming import stream_tempo
+from structure import local_tempo_curve, segment_sections
+
+ANALYSIS_PROFILES = {
+    "full": {
+        "sr": None,          # None keeps the file's native sample rate
+        "mono": True,
+        "offset": 0.0,
+        "duration": None,    # None analyzes to the end of the track
+        "windows": 1,
+    },
+    "fast": {
+        "sr": 22050,
+        "mono": True,
+        "offset": 0.0,
+        "duration": 20.0,    # length of each sampled window, in seconds
+        "windows": 3,
+    },
+    "stream": {
+        "segment_duration": 30.0,  # seconds of audio per tempo-over-time point
+        "block_frames": 256,       # STFT frames decoded per block
+    },
+}
+
+
+def resolve_profile(profile="full", **overrides):
+    """
+    Returns the settings dict for a named profile with overrides applied.
+
+    Args:
+        profile: A key of ANALYSIS_PROFILES.
+        **overrides: Any of the settings the profile defines.
+    """
+    if profile not in ANALYSIS_PROFILES:
+        raise ValueError(f"Unknown analysis profile: {profile!r}")
+    unknown = set(overrides) - set(ANALYSIS_PROFILES[profile])
+    if unknown:
+        raise ValueError(f"Unknown analysis settings: {', '.join(sorted(unknown))}")
+    settings = dict(ANALYSIS_PROFILES[profile])
+    settings.update(overrides)
+    return settings
+
+
+def excerpt_windows(total_duration, duration, windows, offset=0.0):
+    """
+    Picks evenly spaced (offset, duration) excerpts to analyze.
+
+    Windows are spread across [offset, total_duration]. If the track is too
+    short to hold them all, a single excerpt covering the rest of the track is
+    returned instead.
+    """
+    if duration is None or windows <= 1:
+        return [(offset, duration)]
+    if total_duration - offset <= duration * windows:
+        return [(offset, None)]
+    starts = np.linspace(offset, total_duration - duration, windows)
+    return [(float(start), duration) for start in starts]
+
+
+def analyze_audio(source, profile="full", **overrides):
+    """
+    Estimates the tempo of an audio upload.
+
+    Args:
+        source: A Streamlit UploadedFile / BytesIO, or a bytes-like object.
+        profile: Name of the analysis profile to use ("full", "fast" or
+            "stream"; see ANALYSIS_PROFILES).
+        **overrides: Profile settings to override for this call.
+
+    Returns:
+        A dict with a "tempo" array of shape (1,), in BPM, ranked
+        "tempo_candidates" (the tempo, half and double time, ... with
+        confidences; see features.tempo_candidates and with_tempo()) and
+        "descriptors" (energy, danceability, key, ...; see
+        features.SpectralStats.descriptors). When a single continuous excerpt
+        is analyzed it also has "beat_times", a local tempo curve
+        ("tempo_curve_times", "tempo_curve") and "sections" (see
+        structure.segment_sections). The "stream" profile adds
+        "segment_times" and "segment_tempos" instead.
+    """
+    settings = resolve_profile(profile, **overrides)
+    if profile == "stream":
+        return stream_tempo(source, **settings)
+
+    sr, mono = settings["sr"], settings["mono"]
+
+    plan = [(settings["offset"], settings["duration"])]
+    if settings["windows"] > 1 and settings["duration"] is not None:
+        total = audio_duration(source)
+        if total is not None:
+            plan = excerpt_windows(total, settings["duration"], settings["windows"], settings["offset"])
+
+    if len(plan) == 1:
+        offset, duration = plan[0]
+        y, sr = decode_audio(source, sr=sr, mono=mono, offset=offset, duration=duration)
+        return _analyze_excerpt(y, sr, offset)
+
+    # Several windows: pool their tempograms so every window votes on one tempo.
+    tempograms = []
+    stats = None
+    heard_onsets = False
+    for offset, duration in plan:
+        y, sr_out = decode_audio(source, sr=sr, mono=mono, offset=offset, duration=duration)
+        stats = stats or SpectralStats(sr_out)
+        onset_env, _ = _spectral_pass(y, sr_out, stats)
+        stats.add_onsets(onset_env)
+        heard_onsets = heard_onsets or onset_env.any()
+        with stage("tempogram"):
+            tempograms.append(librosa.feature.tempogram(onset_envelope=onset_env, sr=sr_out))
+    with stage("tempo"):
+        tempogram = np.concatenate(tempograms, axis=1)
+        tempo = librosa.feature.tempo(tg=tempogram, sr=sr_out) if heard_onsets else np.zeros(1)
+    return {
+        "tempo": tempo,
+        "tempo_candidates": tempo_candidates(tempogram, float(tempo[0]), sr_out),
+        "descriptors": stats.descriptors(float(tempo[0])),
+    }
+
+
+def _spectral_pass(y, sr, stats, n_fft=2048, hop_length=512):
+    # The one STFT per excerpt: returns the onset envelope and RMS curve and
+    # feeds the descriptor statistics.
+    with stage("stft", y.nbytes):
+        power = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length)) ** 2
+    with stage("onset"):
+        onset_env = onset_envelope(power, librosa.filters.mel(sr=sr, n_fft=n_fft), sr, hop_length)
+    with stage("spectral"):
+        rms = stats.add(power)
+    return onset_env, rms
+
+
+def _analyze_excerpt(y, sr, offset=0.0, hop_length=512):
+    stats = SpectralStats(sr, hop_length=hop_length)
+    onset_env, rms = _spectral_pass(y, sr, stats, hop_length=hop_length)
+    stats.add_onsets(onset_env)
+    # Computed as beat_track would internally, then handed to it, so the
+    # tempo estimate doesn't cost a second tempogram.
+    with stage("tempogram"):
+        win_length = librosa.time_to_frames(8.0, sr=sr, hop_length=hop_length).item()
+        tempogram = librosa.feature.tempogram(
+            onset_envelope=onset_env, sr=sr, hop_length=hop_length, win_length=win_length
+        )
+        # Without onsets the estimate is just the prior's peak; report 0 BPM
+        # for silence, as beat_track does when it estimates the tempo itself.
+        if onset_env.any():
+            tempo = librosa.feature.tempo(tg=tempogram, sr=sr, hop_length=hop_length)
+        else:
+            tempo = np.zeros(1)
+    # trim=False keeps the quiet beats of intros and outros for segmentation;
+    # it doesn't affect the tempo estimate.
+    with stage("beat_track"):
+        _, beats = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, bpm=tempo, trim=False)
+    beat_times = librosa.frames_to_time(beats, sr=sr)
+    with stage("structure"):
+        curve_times, curve = local_tempo_curve(beat_times)
+        # Onset strength is log-domain and loudness-blind, so sections use RMS.
+        sections = segment_sections(rms, beats, beat_times, len(y) / sr)
+    for section in sections:
+        section["start"] += offset
+        section["end"] += offset
+    return {
+        "tempo": tempo,
+        "tempo_candidates": tempo_candidates(tempogram, float(tempo[0]), sr, hop_length),
+        "beat_times": beat_times + offset,
+        "tempo_curve_times": curve_times + offset,
+        "tempo_curve": curve,
+        "sections": sections,
+        "descriptors": stats.descriptors(float(tempo[0])),
+    }
+
+
+def with_tempo(features, tempo):
+    """
+    Returns analysis results moved to another tempo, typically one of their
+    "tempo_candidates" when the analysis locked onto half or double time.
+
+    Section tempos, the tempo curve and segment tempos are scaled by the same
+    factor and danceability is redone, so suggestions can be re-run straight
+    away without touching the audio. Beat times are left as detected.
+    Results with no tempo (silence) have nothing to scale and only take the
+    new global tempo.
+    """
+    detected = float(features["tempo"][0])
+    ratio = tempo / detected if detected > 0 else 1.0
+    features = dict(features)
+    features["tempo"] = np.array([tempo])
+    for key in ("tempo_curve", "segment_tempos"):
+        if key in features:
+            features[key] = np.asarray(features[key]) * ratio
+    if "sections" in features:
+        features["sections"] = [{**section, "tempo": section["tempo"] * ratio} for section in features["sections"]]
+    if features.get("descriptors"):
+        features["descriptors"] = at_tempo(features["descriptors"], tempo)
+    return features
+
+
+def audio_digest(source):
+    """
+    Returns the content hash of an upload's bytes, which identifies it in
+    cache keys and the fingerprint index.
+    """
+    with audio_buffer(source) as view, stage("hash", view.nbytes):
+        return content_hash(view)
+
+
+def cache_key(source, profile="full", digest=None, **overrides):
+    """
+    Returns the AnalysisCache key for analyzing source with these settings:
+    a hash of the audio bytes plus the resolved profile settings.
+
+    Args:
+        digest: audio_digest(source), if the caller already has it.
+    """
+    return make_key(digest or audio_digest(source), resolve_profile(profile, **overrides))
+
+
+def shift_times(features, shift):
+    """
+    Returns analysis results moved shift seconds earlier, dropping anything
+    that would fall before the start of the track.
+
+    Used to reuse the analysis of another file of the same recording that
+    starts shift seconds earlier (e.g. before its intro was trimmed).
+    """
+    features = dict(features)
+    for times, values in (
+        ("beat_times", None),
+        ("tempo_curve_times", "tempo_curve"),
+        ("segment_times", "segment_tempos"),
+    ):
+        if times not in features:
+            continue
+        shifted = np.asarray(features[times]) - shift
+        keep = shifted >= 0
+        if values is not None:
+            # The point still in force at the new start moves to the start.
+            keep[:-1] |= keep[1:]
+            shifted = np.maximum(shifted, 0.0)
+            features[values] = np.asarray(features[values])[keep]
+        features[times] = shifted[keep]
+    if "sections" in features:
+        features["sections"] = [
+            {**section, "start": max(section["start"] - shift, 0.0), "end": section["end"] - shift}
+            for section in features["sections"]
+            if section["end"] - shift > 0
+        ]
+    return features
+
+
+def find_match(source, cache, profile="full", **overrides):
+    """
+    Looks an upload up in the cache's fingerprint index, so a song that was
+    already analyzed from another file (another bitrate or format, a trimmed
+    intro) skips decoding and beat tracking.
+
+    Only a short excerpt of the upload is decoded (see fingerprint.py).
+
+    Returns:
+        The cached analysis of the matching file with its times moved to line
+        up with this one, plus a "fingerprint_match" entry (the matched
+        file's "digest", the "shift" in seconds and the number of "matches"),
+        or None if nothing matched or the match wasn't analyzed with these
+        settings.
+    """
+    if cache is None or cache.fingerprints is None:
+        return None
+    settings = resolve_profile(profile, **overrides)
+    with stage("fingerprint"):
+        hashes, frames, start = query_landmarks(source)
+    with stage("fingerprint_lookup"):
+        match = cache.fingerprints.match(hashes, frames)
+        features = cache.get(make_key(match["digest"], settings)) if match else None
+    if features is None:
+        return None
+    # Where this file's excerpt sits in the matched file, minus where it sits
+    # in this one.
+    shift = match["offset"] - start
+    return {
+        **shift_times(features, shift),
+        "fingerprint_match": {"digest": match["digest"], "shift": shift, "matches": match["matches"]},
+    }
+
+
+def analyze_with_cache(source, cache=None, profile="full", digest=None, match_fingerprints=True, **overrides):
+    """
+    Like analyze_audio(), but consults and fills an AnalysisCache first.
+
+    A repeat upload analyzed with the same settings is free (see cache_key()).
+    Another file of an already analyzed song costs a short excerpt decode
+    (see find_match()). Newly analyzed songs are added to the fingerprint index.
+
+    Args:
+        source: A Streamlit UploadedFile / BytesIO, or a bytes-like object.
+        cache: An AnalysisCache, or None to skip caching.
+        profile: Name of the analysis profile to use.
+        digest: audio_digest(source), if the caller already has it.
+        match_fingerprints: If False, analyze the upload itself rather than
+            reuse another file's analysis, e.g. after a wrong match. The new
+            result replaces a cached one that came from a match.
+        **overrides: Profile settings to override for this call.
+    """
+    if cache is None:
+        return analyze_audio(source, profile, **overrides)
+
+    digest = digest or audio_digest(source)
+    key = make_key(digest, resolve_profile(profile, **overrides))
+    with stage("cache_lookup"):
+        cached = cache.get(key)
+    if cached is not None and (match_fingerprints or "fingerprint_match" not in cached):
+        return cached
+
+    # A file that is already in the index would only match itself.
+    indexed = cache.fingerprints is None or digest in cache.fingerprints
+    features = None
+    if match_fingerprints and not indexed:
+        features = find_match(source, cache, profile, **overrides)
+    if features is None:
+        features = analyze_audio(source, profile, **overrides)
+        if not indexed:
+            with stage("fingerprint"):
+                hashes, frames = reference_landmarks(source)
+            with stage("fingerprint_store"):
+                cache.fingerprints.add(digest, hashes, frames)
+    with stage("cache_store"):
+        cache.put(key, features)
+    return features
+
+
+def warm_up(numba_cache_dir=None):
+    """
+    Runs every analysis profile once on a few seconds of synthetic clicks, so
+    the first real analysis in this process runs at steady-state speed.
+
+    Meant to run at startup, e.g. as a worker pool initializer (see
+    jobs.JobQueue). It points numba's on-disk cache at a persistent directory
+    first, so compiled code survives restarts and deploys. The first warm-up
+    against an empty cache compiles everything and can take a minute;
+    afterwards it takes a few seconds.
+
+    Args:
+        numba_cache_dir: Where numba caches compiled functions. Defaults to
+            the NUMBA_CACHE_DIR environment variable, or "numba" inside the
+            analysis cache directory. Has no effect if numba was already
+            imported in this process.
+    """
+    if numba_cache_dir is None:
+        cache_dir = os.environ.get("DANCE_AI_CACHE_DIR", DEFAULT_CACHE_DIR)
+        numba_cache_dir = os.environ.get("NUMBA_CACHE_DIR", os.path.join(cache_dir, "numba"))
+    os.environ["NUMBA_CACHE_DIR"] = numba_cache_dir
+
+    sr = 44100
+    y = librosa.clicks(times=np.arange(0.0, 4.0, 0.5), sr=sr, length=4 * sr)
+    wav = io.BytesIO()
+    sf.write(wav, y, sr, format="WAV")
+    data = wav.getvalue()
+    # Short windows so "fast" takes its multi-window path (and resamples).
+    analyze_audio(data, "fast", duration=1.0)
+    analyze_audio(data, "full")
+    analyze_audio(data, "stream", segment_duration=2.0)
@@ -0,0 +1,229 @@
+"""
+Content-hash cache for song analysis results.
+
+Results are keyed by a SHA-256 of the uploaded audio bytes plus the analysis
+parameters, so the same track analyzed twice (by anyone) only pays for
+decoding and beat tracking once. There are two tiers:
+
+  * an in-memory LRU tier bounded by ``max_entries``
+  * a persistent SQLite tier on disk that survives Streamlit restarts
+
+Hits and misses for both tiers are counted and available via ``stats()``.
+
+A byte hash never matches the same song encoded differently, so the
+persistent tier also keeps an audio fingerprint index
+(``AnalysisCache.fingerprints``, see fingerprint.py) that
+analysis.analyze_with_cache() consults before analyzing a new upload.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from fingerprint import FingerprintIndex
+
+# Bump this whenever the analysis output changes shape or meaning so stale
+# on-disk entries are never served.
+ANALYSIS_VERSION = 6
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dance-ai")
+
+
+def content_hash(data):
+    """
+    Returns the hex SHA-256 digest of an audio payload.
+
+    Args:
+        data: Any bytes-like object (bytes, bytearray or memoryview).
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(digest, params=None):
+    """
+    Builds a cache key from a content digest and the analysis parameters.
+
+    Args:
+        digest: The hex digest returned by content_hash().
+        params: A JSON-serializable dict of parameters that affect the result.
+    """
+    payload = json.dumps(
+        {"version": ANALYSIS_VERSION, "params": params or {}},
+        sort_keys=True,
+        default=str,
+    )
+    params_digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+    return f"{digest}:{params_digest}"
+
+
+def _encode_value(value):
+    # NumPy arrays and scalars are tagged so they round-trip through JSON.
+    if isinstance(value, np.ndarray):
+        return {"__ndarray__": value.tolist(), "dtype": str(value.dtype)}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _decode_value(obj):
+    if "__ndarray__" in obj:
+        return np.asarray(obj["__ndarray__"], dtype=obj["dtype"])
+    return obj
+
+
+def dumps(result):
+    """Serializes an analysis result dict to a JSON string."""
+    return json.dumps(result, default=_encode_value)
+
+
+def loads(text):
+    """Deserializes a JSON string produced by dumps()."""
+    return json.loads(text, object_hook=_decode_value)
+
+
+class AnalysisCache:
+    """
+    Two-tier (memory LRU + SQLite) cache of analysis results.
+
+    Safe to share between Streamlit sessions (threads) and between processes
+    pointing at the same cache directory. It can be pickled to hand it to a
+    worker process; the copy starts with an empty memory tier and its own
+    counters, and shares the on-disk tier.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=256, persist=True, fingerprints=True):
+        """
+        Args:
+            cache_dir: Directory holding the SQLite database. Defaults to the
+                DANCE_AI_CACHE_DIR environment variable or ~/.cache/dance-ai.
+            max_entries: Maximum number of results kept in memory.
+            persist: If False, only the in-memory tier is used.
+            fingerprints: If True (and persist is), also keep a
+                FingerprintIndex of analyzed tracks in self.fingerprints.
+        """
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self.db_path = None
+        self.fingerprints = None
+        if persist:
+            cache_dir = cache_dir or os.environ.get("DANCE_AI_CACHE_DIR", DEFAULT_CACHE_DIR)
+            os.makedirs(cache_dir, exist_ok=True)
+            self.db_path = os.path.join(cache_dir, "analysis_cache.sqlite3")
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS analysis ("
+                    " key TEXT PRIMARY KEY,"
+                    " result TEXT NOT NULL,"
+                    " created_at REAL DEFAULT (strftime('%s', 'now')))"
+                )
+            if fingerprints:
+                self.fingerprints = FingerprintIndex(cache_dir)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_memory"] = OrderedDict()
+        state["_counters"] = dict.fromkeys(self._counters, 0)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation keeps this safe across threads
+        # and processes without holding a lock on the database file.
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, key, result):
+        # Caller must hold self._lock.
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key):
+        """
+        Returns the cached result for key, or None on a miss.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return self._memory[key]
+
+        if self.db_path is not None:
+            with self._connect() as conn:
+                row = conn.execute("SELECT result FROM analysis WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                result = loads(row[0])
+                with self._lock:
+                    self._remember(key, result)
+                    self._counters["disk_hits"] += 1
+                return result
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key, result):
+        """
+        Stores a result in both tiers.
+        """
+        with self._lock:
+            self._remember(key, result)
+        if self.db_path is not None:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO analysis (key, result) VALUES (?, ?)",
+                    (key, dumps(result)),
+                )
+
+    def remember(self, key, result):
+        """
+        Stores a result in the memory tier only, e.g. one a worker process
+        has already written to the shared disk tier.
+        """
+        with self._lock:
+            self._remember(key, result)
+
+    def clear(self):
+        """
+        Drops every entry from both tiers and the fingerprint index. Counters
+        are left untouched.
+        """
+        with self._lock:
+            self._memory.clear()
+        if self.db_path is not None:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM analysis")
+        if self.fingerprints is not None:
+            self.fingerprints.clear()
+
+    def stats(self):
+        """
+        Returns a snapshot of the hit/miss counters, current memory size and
+        number of fingerprinted tracks.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_entries"] = len(self._memory)
+        counters["hits"] = counters["memory_hits"] + counters["disk_hits"]
+        counters["fingerprinted_tracks"] = len(self.fingerprints) if self.fingerprints is not None else 0
+        return counters
@@ -0,0 +1,396 @@
+"""
+Headless HTTP/JSON API for the analysis and suggestion pipeline.
+
+A small Starlette (ASGI) app served by uvicorn. Request handlers never do the
+CPU-heavy work themselves. Audio analysis goes to the same bounded worker
+pool the Streamlit app uses (jobs.JobQueue), and cached results are answered
+straight away. Jobs check the fingerprint index before analyzing, so another
+encode of a song that was already analyzed finishes in milliseconds.
+
+Endpoints:
+    GET  /health                     queue, cache and upload-store stats
+    POST /uploads                    store audio (raw body or multipart "file")
+    POST /analyze                    analyze an upload_id or a raw/multipart body
+    GET  /jobs/{job_id}              poll an analysis job; returns the result when done
+    GET  /suggest?bpm=128&genre=...  suggestions for a known tempo, no audio needed
+                                     (add energy, danceability and brightness, 0..1,
+                                     to rank styles by them too)
+    GET  /metrics                    per-stage timing counters, Prometheus text format
+
+/analyze and /jobs accept ?genre=... and ?tempo=BPM. The tempo replaces the
+detected one for the suggestions, e.g. another of the result's
+"tempo_candidates" when the analysis locked onto half or double time.
+Repeating /analyze with the same upload_id and a new tempo is answered from
+the cache. /analyze also takes ?profile=full|fast|stream
+and ?wait=SECONDS to hold the request open until the job finishes. Adding
+?debug=1 includes the job's stage timings in the result, and ?cprofile=1
+(on /analyze) also captures a cProfile report of the analysis. If a song was
+wrongly recognized as one analyzed before (a "fingerprint_match" in features),
+?reanalyze=1 on /analyze analyzes the file itself and replaces that result.
+
+Usage:
+    python api.py --port 8000 --workers 4 --max-concurrent 64 --warm-up
+"""
+import argparse
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from analysis import ANALYSIS_PROFILES, analyze_with_cache, audio_digest, cache_key, warm_up
+from analysis_cache import AnalysisCache, content_hash
+from audio_io import sniff_format
+from instrumentation import METRICS, Trace, record, stage, traced_call
+from jobs import JobQueue, QueueFull
+from pipeline import describe, to_jsonable
+from suggestions import GENRE_OPTIONS, TRAIT_WEIGHTS, rank_styles, suggest_dance_style
+
+DEFAULT_GENRE = GENRE_OPTIONS[0]
+# Allowance for multipart boundaries and part headers on top of the file
+# itself when checking Content-Length.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class ApiError(Exception):
+    """An error that maps directly onto an HTTP error response."""
+
+    def __init__(self, status_code, message, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers
+
+
+class UploadStore:
+    """
+    In-memory store of uploaded audio keyed by content hash, evicting the
+    least recently used uploads once max_bytes is exceeded.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._uploads = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, data):
+        digest = content_hash(data)
+        with self._lock:
+            if digest not in self._uploads:
+                self._uploads[digest] = data
+                self._size += len(data)
+            self._uploads.move_to_end(digest)
+            while self._size > self.max_bytes and len(self._uploads) > 1:
+                _, evicted = self._uploads.popitem(last=False)
+                self._size -= len(evicted)
+        return digest
+
+    def get(self, upload_id):
+        with self._lock:
+            data = self._uploads.get(upload_id)
+            if data is not None:
+                self._uploads.move_to_end(upload_id)
+            return data
+
+    def __len__(self):
+        return len(self._uploads)
+
+
+class ConcurrencyLimit:
+    """
+    ASGI middleware that answers 503 once max_concurrent HTTP requests are in
+    flight, so a burst of clients can't queue unbounded work in the server.
+    """
+
+    def __init__(self, app, max_concurrent=64):
+        self.app = app
+        self.max_concurrent = max_concurrent
+        self.active = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.active >= self.max_concurrent:
+            response = JSONResponse(
+                {"error": "Too many concurrent requests"}, status_code=503, headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+        self.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.active -= 1
+
+
+def _genre(request):
+    genre = request.query_params.get("genre", DEFAULT_GENRE)
+    if genre not in GENRE_OPTIONS:
+        raise ApiError(400, f"Unknown genre {genre!r}; expected one of {list(GENRE_OPTIONS)}")
+    return genre
+
+
+async def _read_audio(request):
+    # Either a multipart form with a "file" field, or the raw request body.
+    # Oversized payloads are refused before they are held in memory: by
+    # Content-Length when the client sends one, and while streaming otherwise.
+    limit = request.app.state.max_upload_bytes
+    multipart = request.headers.get("content-type", "").startswith("multipart/form-data")
+    try:
+        declared = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise ApiError(400, "Invalid Content-Length header")
+    if declared > limit + (MULTIPART_OVERHEAD_BYTES if multipart else 0):
+        raise ApiError(413, "Audio file is too large")
+
+    if multipart:
+        # Starlette spools form files to disk past 1 MB, so only the file
+        # itself is read into memory, once its size is known.
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise ApiError(400, "Multipart requests need a 'file' field")
+        if upload.size is not None and upload.size > limit:
+            raise ApiError(413, "Audio file is too large")
+        data = await upload.read()
+    else:
+        chunks, size = [], 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > limit:
+                raise ApiError(413, "Audio file is too large")
+            chunks.append(chunk)
+        data = b"".join(chunks)
+    if not data:
+        raise ApiError(400, "No audio data in request")
+    if len(data) > limit:
+        raise ApiError(413, "Audio file is too large")
+    return data
+
+
+def _flag(request, name):
+    return request.query_params.get(name, "").lower() in ("1", "true", "yes")
+
+
+def _bpm(request, name):
+    # A positive, finite tempo query parameter (NaN fails the comparison too).
+    try:
+        bpm = float(request.query_params[name])
+    except ValueError:
+        bpm = 0.0
+    if not 0 < bpm < 1000:
+        raise ApiError(400, f"{name} must be a positive number of BPM")
+    return bpm
+
+
+def _tempo(request):
+    # Optional ?tempo=BPM to suggest for instead of the detected tempo.
+    if "tempo" not in request.query_params:
+        return None
+    return _bpm(request, "tempo")
+
+
+def _job_response(request, job_id, genre):
+    jobs = request.app.state.jobs
+    status = jobs.status(job_id)
+    if status["state"] == "unknown":
+        raise ApiError(404, f"Unknown or expired job {job_id}")
+    if status["state"] == "done":
+        features, timings = jobs.future(job_id).result()
+        body = {"job_id": job_id, "state": "done", **describe(features, genre, _tempo(request))}
+        if _flag(request, "debug"):
+            body["timings"] = timings
+        return JSONResponse(body)
+    if status["state"] == "failed":
+        error = jobs.future(job_id).exception()
+        return JSONResponse(
+            {"job_id": job_id, "state": "failed", "error": f"{type(error).__name__}: {error}"}, status_code=422
+        )
+    return JSONResponse(
+        {"job_id": job_id, "status_url": f"/jobs/{job_id}", **to_jsonable(status)}, status_code=202
+    )
+
+
+async def health(request):
+    state = request.app.state
+    return JSONResponse({
+        "status": "ok",
+        "pending_jobs": state.jobs.pending_count(),
+        "max_pending_jobs": state.jobs.max_pending,
+        "uploads": len(state.uploads),
+        "cache": state.cache.stats(),
+    })
+
+
+async def create_upload(request):
+    data = await _read_audio(request)
+    upload_id = await run_in_threadpool(request.app.state.uploads.put, data)
+    return JSONResponse(
+        {"upload_id": upload_id, "format": sniff_format(data), "bytes": len(data)}, status_code=201
+    )
+
+
+async def analyze(request):
+    state = request.app.state
+    genre = _genre(request)
+    tempo = _tempo(request)
+    profile = request.query_params.get("profile", "full")
+    if profile not in ANALYSIS_PROFILES:
+        raise ApiError(400, f"Unknown profile {profile!r}; expected one of {sorted(ANALYSIS_PROFILES)}")
+    try:
+        wait = float(request.query_params.get("wait", 0))
+    except ValueError:
+        raise ApiError(400, "wait must be a number of seconds")
+
+    reanalyze = _flag(request, "reanalyze")
+
+    with Trace("api.analyze", analysis_profile=profile) as trace:
+        upload_id = request.query_params.get("upload_id")
+        if upload_id:
+            data = state.uploads.get(upload_id)
+            if data is None:
+                raise ApiError(404, f"Unknown or expired upload {upload_id}")
+            digest = upload_id  # uploads are stored by content hash
+        else:
+            with stage("read_body") as info:
+                data = await _read_audio(request)
+                info["bytes"] = len(data)
+            digest = await run_in_threadpool(audio_digest, data)
+
+        key = cache_key(data, profile, digest=digest)
+        with stage("cache_lookup"):
+            cached = await run_in_threadpool(state.cache.get, key)
+        if cached is not None and reanalyze and "fingerprint_match" in cached:
+            cached = None
+    record(trace, cached=cached is not None)
+    if cached is not None:
+        body = {"state": "done", "cached": True, **describe(cached, genre, tempo)}
+        if _flag(request, "debug"):
+            body["timings"] = trace.as_dict()
+        return JSONResponse(body)
+
+    def store(result):
+        # The worker already wrote the result to the shared disk tier.
+        features, timings = result
+        state.cache.remember(key, features)
+        record(timings, analysis_profile=profile)
+
+    try:
+        job_id = state.jobs.submit(
+            traced_call,
+            analyze_with_cache,
+            data,
+            state.cache,
+            profile,
+            digest=digest,
+            match_fingerprints=not reanalyze,
+            cprofile=_flag(request, "cprofile"),
+            on_done=store,
+        )
+    except QueueFull as e:
+        raise ApiError(503, str(e), headers={"Retry-After": "5"})
+
+    if wait > 0:
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(state.jobs.future(job_id))), wait)
+        except Exception:
+            pass  # still running (timeout) or failed; _job_response reports which
+    return _job_response(request, job_id, genre)
+
+
+async def job_status(request):
+    return _job_response(request, request.path_params["job_id"], _genre(request))
+
+
+async def suggest(request):
+    if "bpm" not in request.query_params:
+        raise ApiError(400, "bpm query parameter is required")
+    bpm = _bpm(request, "bpm")
+    genre = _genre(request)
+    descriptors = None
+    if any(trait in request.query_params for trait in TRAIT_WEIGHTS):
+        try:
+            descriptors = {trait: float(request.query_params[trait]) for trait in TRAIT_WEIGHTS}
+        except (KeyError, ValueError):
+            descriptors = {}
+        if len(descriptors) < len(TRAIT_WEIGHTS) or not all(0 <= v <= 1 for v in descriptors.values()):
+            raise ApiError(400, f"{', '.join(TRAIT_WEIGHTS)} must all be given as numbers from 0 to 1")
+    return JSONResponse({
+        "tempo": bpm,
+        "genre": genre,
+        "suggestion": to_jsonable(suggest_dance_style(bpm, genre, descriptors)),
+        "ranking": rank_styles(bpm, descriptors, genre) if descriptors else [],
+    })
+
+
+async def metrics(request):
+    return PlainTextResponse(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def _api_error(request, exc):
+    return JSONResponse({"error": str(exc)}, status_code=exc.status_code, headers=exc.headers)
+
+
+def create_app(cache=None, jobs=None, max_concurrent=64, max_upload_bytes=200 * 1024 * 1024, upload_store_bytes=None):
+    """
+    Builds the ASGI app.
+
+    Args:
+        cache: AnalysisCache to use; defaults to the shared on-disk cache.
+        jobs: JobQueue to run analysis on; defaults to one process per core.
+        max_concurrent: HTTP requests allowed in flight before answering 503.
+        max_upload_bytes: Largest accepted audio payload.
+        upload_store_bytes: Memory budget for /uploads (default 512 MB).
+    """
+    app = Starlette(
+        routes=[
+            Route("/health", health),
+            Route("/uploads", create_upload, methods=["POST"]),
+            Route("/analyze", analyze, methods=["POST"]),
+            Route("/jobs/{job_id}", job_status),
+            Route("/suggest", suggest),
+            Route("/metrics", metrics),
+        ],
+        exception_handlers={ApiError: _api_error},
+    )
+    app.state.cache = cache if cache is not None else AnalysisCache()
+    app.state.jobs = jobs if jobs is not None else JobQueue()
+    app.state.uploads = UploadStore(upload_store_bytes) if upload_store_bytes else UploadStore()
+    app.state.max_upload_bytes = max_upload_bytes
+    app.add_middleware(ConcurrencyLimit, max_concurrent=max_concurrent)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dance analysis pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="Analysis processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=None, help="Queued analysis jobs before 503")
+    parser.add_argument("--max-concurrent", type=int, default=64, help="In-flight HTTP requests before 503")
+    parser.add_argument(
+        "--warm-up", action="store_true", help="Load librosa and its compiled code in every worker at startup"
+    )
+    args = parser.parse_args(argv)
+
+    # One structured timing line per request on the "dance_ai.timing" logger.
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    app = create_app(
+        jobs=JobQueue(
+            max_workers=args.workers,
+            max_pending=args.max_pending,
+            initializer=warm_up if args.warm_up else None,
+        ),
+        max_concurrent=args.max_concurrent,
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
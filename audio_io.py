@@ -0,0 +1,211 @@
+"""
+In-memory audio decoding for uploaded files.
+
+Uploads are decoded straight from their in-memory buffer with soundfile
+(libsndfile), so the common formats (WAV, FLAC, OGG, AIFF and, with
+libsndfile >= 1.1, MP3) never touch the disk. The container format is sniffed
+from the file's magic bytes rather than trusted from its name. Anything
+libsndfile can't handle falls back to librosa/audioread through a temporary
+file with the correct suffix, which is always removed afterwards.
+"""
+import io
+import os
+import tempfile
+
+import librosa
+import soundfile as sf
+
+from instrumentation import stage
+
+# Magic-byte signatures, checked in order. Each entry is
+# (format, offset, signature).
+_SIGNATURES = (
+    ("wav", 0, b"RIFF"),
+    ("wav", 0, b"RF64"),
+    ("flac", 0, b"fLaC"),
+    ("ogg", 0, b"OggS"),
+    ("aiff", 0, b"FORM"),
+    ("mp3", 0, b"ID3"),
+    ("m4a", 4, b"ftyp"),
+)
+
+# Sniffed format -> libsndfile major format name.
+_SOUNDFILE_FORMATS = {
+    "wav": "WAV",
+    "flac": "FLAC",
+    "ogg": "OGG",
+    "aiff": "AIFF",
+    "mp3": "MP3",
+}
+
+
+def sniff_format(buffer):
+    """
+    Returns the container format of an audio payload from its magic bytes.
+
+    Args:
+        buffer: A bytes-like object holding (at least the start of) the file.
+
+    Returns:
+        One of "wav", "flac", "ogg", "aiff", "mp3", "m4a", or None if the
+        format isn't recognized.
+    """
+    head = bytes(buffer[:16])
+    for fmt, offset, signature in _SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return fmt
+    # Raw MPEG audio without an ID3 tag starts with an 11-bit frame sync.
+    if len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0:
+        return "mp3"
+    return None
+
+
+def audio_buffer(source):
+    """
+    Returns a zero-copy memoryview over an upload's bytes.
+
+    Works with Streamlit's UploadedFile (and any io.BytesIO) via getbuffer(),
+    and with plain bytes, bytearray or memoryview objects. Release the view
+    (or use it as a context manager) before writing to the source again.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return memoryview(source)
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer()
+    return memoryview(source.getvalue())
+
+
+class _BufferReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over a memoryview, without copying it.
+    """
+
+    def __init__(self, view):
+        self._view = view.cast("B") if view.format != "B" else view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = len(chunk)
+        b[:n] = chunk
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        self._pos = max(self._pos, 0)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def open_reader(source):
+    """
+    Returns a seekable file object over an upload, rewound to the start.
+
+    File-like uploads are read in place; raw buffers get a zero-copy reader.
+    """
+    if hasattr(source, "read") and hasattr(source, "seek"):
+        source.seek(0)
+        return source
+    return _BufferReader(audio_buffer(source))
+
+
+def soundfile_supports(fmt):
+    """
+    Returns True if the installed libsndfile can decode the given format.
+    """
+    major = _SOUNDFILE_FORMATS.get(fmt)
+    return major is not None and major in sf.available_formats()
+
+
+def audio_duration(source):
+    """
+    Returns the duration of an upload in seconds, read from its header.
+
+    Returns None if libsndfile can't open the format, in which case the only
+    way to learn the duration is to decode the whole file.
+    """
+    try:
+        return sf.info(open_reader(source)).duration
+    except sf.SoundFileRuntimeError:
+        return None
+
+
+def decode_audio(source, sr=None, mono=True, offset=0.0, duration=None, stats=None):
+    """
+    Decodes an audio upload into a float32 waveform.
+
+    Args:
+        source: A Streamlit UploadedFile / BytesIO, or a bytes-like object.
+        sr: Target sample rate, or None to keep the native rate.
+        mono: If True, downmix to a single channel.
+        offset: Start reading this many seconds into the track.
+        duration: Only decode this many seconds, or None for the rest.
+        stats: Optional dict that is filled in with the sniffed "format", the
+            decoding "path" ("memory" or "tempfile") and "bytes_copied", the
+            number of payload bytes duplicated outside the decoder.
+
+    Returns:
+        A (y, sr) tuple, as returned by librosa.load.
+    """
+    with audio_buffer(source) as view:
+        fmt = sniff_format(view)
+        size = view.nbytes
+
+    if stats is None:
+        stats = {}
+    stats["format"] = fmt
+    stats["bytes_in"] = size
+
+    if fmt is None or soundfile_supports(fmt):
+        try:
+            y, sr_out = _load(open_reader(source), sr, mono, offset, duration)
+            stats["path"] = "memory"
+            stats["bytes_copied"] = 0
+            return y, sr_out
+        except sf.SoundFileRuntimeError:
+            # Fall through to the audioread backend below.
+            pass
+
+    return _decode_via_tempfile(source, fmt, sr, mono, offset, duration, size, stats)
+
+
+def _load(path_or_file, sr, mono, offset, duration):
+    # Same as librosa.load(sr=sr), but with decoding and resampling timed as
+    # separate stages.
+    with stage("decode") as info:
+        y, sr_native = librosa.load(path_or_file, sr=None, mono=mono, offset=offset, duration=duration)
+        info["bytes"] = y.nbytes
+    if sr is None or sr == sr_native:
+        return y, sr_native
+    with stage("resample", y.nbytes):
+        return librosa.resample(y, orig_sr=sr_native, target_sr=sr), sr
+
+
+def _decode_via_tempfile(source, fmt, sr, mono, offset, duration, size, stats):
+    # audioread/ffmpeg can only open paths, so spill to disk as a last resort.
+    suffix = f".{fmt}" if fmt else ""
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with stage("temp_file", size), os.fdopen(fd, "wb") as tmp_file, audio_buffer(source) as view:
+            tmp_file.write(view)
+        y, sr_out = _load(tmp_path, sr, mono, offset, duration)
+    finally:
+        os.remove(tmp_path)
+
+    stats["path"] = "tempfile"
+    stats["bytes_copied"] = size
+    return y, sr_out
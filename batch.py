@@ -0,0 +1,208 @@
+"""
+Batch analysis of a whole set list.
+
+Runs every track through the same analysis and suggestion pipeline as the
+app, fanning the CPU-bound decoding and beat tracking out over a process pool
+sized to the machine. Results are printed as each track finishes and written
+to a combined CSV or JSON report.
+
+Usage:
+    python batch.py SONGS_DIR [MORE_FILES_OR_DIRS ...] -o report.csv
+    python batch.py setlist/ --genre "Latin/Ballroom" --profile fast -o report.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from analysis import ANALYSIS_PROFILES, analyze_with_cache
+from analysis_cache import AnalysisCache
+from suggestions import GENRE_OPTIONS, suggest_dance_style
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".ogg", ".m4a", ".aiff", ".aif")
+
+REPORT_FIELDS = (
+    "file",
+    "tempo",
+    "tempo_candidates",
+    "energy",
+    "danceability",
+    "key",
+    "style",
+    "routine",
+    "costume",
+    "costume_shop_link",
+    "embedded_video_link",
+    "seconds",
+    "error",
+)
+
+# Per-worker-process cache, opened once by _init_worker().
+_worker_cache = None
+
+
+def find_tracks(paths):
+    """
+    Expands files and directories (searched recursively) into a sorted list of
+    audio file paths.
+    """
+    tracks = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                tracks.extend(
+                    os.path.join(root, name)
+                    for name in files
+                    if name.lower().endswith(AUDIO_EXTENSIONS)
+                )
+        else:
+            tracks.append(path)
+    return sorted(tracks)
+
+
+def _init_worker(cache_dir):
+    global _worker_cache
+    if cache_dir is not False:
+        _worker_cache = AnalysisCache(cache_dir=cache_dir)
+
+
+def analyze_track(path, genre="Auto-Detect (BPM only)", profile="full"):
+    """
+    Analyzes one file and returns its report row. Never raises; failures are
+    reported in the row's "error" field so one bad file can't sink a batch.
+    """
+    row = dict.fromkeys(REPORT_FIELDS, "")
+    row["file"] = path
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            audio_bytes = f.read()
+        features = analyze_with_cache(audio_bytes, _worker_cache, profile)
+        tempo = float(features["tempo"][0])
+        descriptors = features.get("descriptors")
+        suggestions = suggest_dance_style(tempo, genre, descriptors)
+        row["tempo"] = round(tempo, 2)
+        row["tempo_candidates"] = "; ".join(
+            f"{c['bpm']:.1f} ({c['confidence']:.0%})" for c in features.get("tempo_candidates", [])
+        )
+        if descriptors:
+            row["energy"] = round(descriptors["energy"], 2)
+            row["danceability"] = round(descriptors["danceability"], 2)
+            row["key"] = descriptors["key"]
+        for field in ("style", "routine", "costume", "costume_shop_link", "embedded_video_link"):
+            row[field] = suggestions[field]
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def run_batch(tracks, genre="Auto-Detect (BPM only)", profile="full", workers=None, cache_dir=None):
+    """
+    Analyzes tracks in parallel, yielding report rows in completion order.
+    A track that crashes its worker process gets an error row, and the rest
+    of the batch carries on.
+
+    Args:
+        tracks: List of audio file paths.
+        genre: Genre passed to suggest_dance_style for every track.
+        profile: Analysis profile name.
+        workers: Number of worker processes. Defaults to the CPU count.
+        cache_dir: AnalysisCache directory; None for the default location,
+            False to disable caching.
+    """
+    workers = workers or os.cpu_count() or 1
+    pending = list(tracks)
+    while pending:
+        lost = []
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(cache_dir,)
+        ) as pool:
+            futures = {pool.submit(analyze_track, path, genre, profile): path for path in pending}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except BrokenProcessPool:
+                    lost.append(futures[future])
+
+        # A worker died (e.g. killed for running out of memory on a long mix)
+        # and took every unfinished track down with it. Workers take tracks
+        # in submission order, so only the first few unfinished ones can have
+        # been running: retry those one at a time to pin the crash on the
+        # right file, and the rest on a fresh pool.
+        order = {path: i for i, path in enumerate(pending)}
+        lost.sort(key=order.get)
+        suspects, pending = lost[:workers + 1], lost[workers + 1:]
+        for path in suspects:
+            yield _analyze_isolated(path, genre, profile, cache_dir)
+
+
+def _analyze_isolated(path, genre, profile, cache_dir):
+    # Runs one track in a worker of its own, so a crash is its row's error.
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(cache_dir,)) as pool:
+        try:
+            return pool.submit(analyze_track, path, genre, profile).result()
+        except BrokenProcessPool as e:
+            row = dict.fromkeys(REPORT_FIELDS, "")
+            row["file"] = path
+            row["error"] = f"{type(e).__name__}: the worker analyzing this track died (out of memory?)"
+            return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a set list of songs in parallel.")
+    parser.add_argument("paths", nargs="+", help="Audio files or directories to analyze")
+    parser.add_argument("-o", "--output", default="report.csv", help="Report path (.csv or .json)")
+    parser.add_argument("--genre", default=GENRE_OPTIONS[0], choices=GENRE_OPTIONS)
+    parser.add_argument("--profile", default="full", choices=sorted(ANALYSIS_PROFILES))
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the analysis cache")
+    args = parser.parse_args(argv)
+
+    tracks = find_tracks(args.paths)
+    if not tracks:
+        parser.error("no audio files found")
+
+    as_json = args.output.lower().endswith(".json")
+    rows = []
+    start = time.perf_counter()
+    with open(args.output, "w", newline="", encoding="utf-8") as out:
+        writer = None
+        if not as_json:
+            writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+
+        for done, row in enumerate(
+            run_batch(
+                tracks,
+                genre=args.genre,
+                profile=args.profile,
+                workers=args.workers,
+                cache_dir=False if args.no_cache else None,
+            ),
+            start=1,
+        ):
+            status = f"{row['tempo']} BPM" if not row["error"] else f"FAILED ({row['error']})"
+            print(f"[{done}/{len(tracks)}] {row['file']}: {status}", file=sys.stderr)
+            if as_json:
+                rows.append(row)
+            else:
+                # Rows are flushed as they arrive so a long batch is never lost.
+                writer.writerow(row)
+                out.flush()
+
+        if as_json:
+            order = {path: i for i, path in enumerate(tracks)}
+            rows.sort(key=lambda r: order[r["file"]])
+            json.dump(rows, out, indent=2, ensure_ascii=False)
+
+    elapsed = time.perf_counter() - start
+    print(f"Analyzed {len(tracks)} tracks in {elapsed:.1f}s -> {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Offline benchmark suite for the analysis pipeline. See benchmarks/bench.py.
+"""
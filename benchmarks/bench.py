@@ -0,0 +1,283 @@
+"""
+Benchmarks for the analysis pipeline on synthetic fixtures with known tempo.
+
+For every fixture this times each stage separately, repeated --repeat times:
+
+  * decode: decode_audio() of the whole file at its native sample rate
+  * beat: librosa.beat.beat_track() on the decoded waveform
+  * analyze/<profile>: analysis.analyze_audio() end to end, per profile
+  * suggest: one suggest_dance_style() call (timed over many calls)
+
+It reports p50/p99 latency, throughput (seconds of audio per wall second),
+peak RSS growth during each stage, and whether each profile's tempo matches
+the fixture's BPM. "octave" means the tempo was off by a factor of 2 or 3,
+which the beat tracker's 120 BPM prior sometimes picks at the extremes of the
+range.
+
+benchmarks/baseline.json records the status each fixture and profile had
+when it was last accepted. The run exits with status 1 if any result is
+worse than its baseline (ok -> octave, or anything -> wrong), so speedups
+can't silently break accuracy. A fixture missing from the baseline is
+expected to be "ok". With --strict every octave error fails. After an
+intended change, accept the new statuses with --update-baseline.
+
+Runs offline on CPU only. Usage (from the repository root):
+
+    python -m benchmarks.bench                       # quick preset
+    python -m benchmarks.bench --preset long --profile stream --profile fast
+    python -m benchmarks.bench --bpm 128 --duration 3600 --profile stream --json out.json
+    python -m benchmarks.bench --preset rates --profile stream --update-baseline
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import timeit
+
+import librosa
+import numpy as np
+
+from analysis import ANALYSIS_PROFILES, analyze_audio
+from audio_io import decode_audio
+from benchmarks.fixtures import FIXTURE_KINDS, get_fixture
+from suggestions import suggest_dance_style
+
+PRESETS = {
+    "quick": {"bpm": [60, 90, 128, 174, 200], "duration": [10, 30], "sr": [44100], "kind": list(FIXTURE_KINDS)},
+    "rates": {"bpm": [128], "duration": [30], "sr": [22050, 44100, 48000], "kind": list(FIXTURE_KINDS)},
+    "long": {"bpm": [124], "duration": [600, 3600], "sr": [44100], "kind": ["loop"]},
+}
+
+# Tempo within this relative error of the fixture's BPM counts as correct.
+TEMPO_TOLERANCE = 0.03
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Tempo statuses from best to worst.
+STATUS_RANK = {"ok": 0, "octave": 1, "wrong": 2}
+
+
+class PeakRss:
+    """
+    Samples this process's resident set size in a background thread and
+    records the peak growth over the starting RSS. Uses /proc on Linux and
+    falls back to getrusage's lifetime peak elsewhere.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_delta = 0
+        self._stop = threading.Event()
+
+    @staticmethod
+    def current():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_delta = max(self.peak_delta, self.current() - self.start)
+
+    def __enter__(self):
+        self.start = self.current()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_delta = max(self.peak_delta, self.current() - self.start)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def tempo_status(estimate, bpm):
+    """Classifies an estimate as "ok", "octave" or "wrong" for a known BPM."""
+    for factor, status in ((1, "ok"), (2, "octave"), (0.5, "octave"), (3, "octave"), (1 / 3, "octave")):
+        if abs(estimate - bpm * factor) <= TEMPO_TOLERANCE * bpm * factor:
+            return status
+    return "wrong"
+
+
+def baseline_key(row, profile):
+    """Names a fixture and profile in baseline.json, e.g. "loop/128bpm/30s/44100hz/wav/fast"."""
+    return (
+        f"{row['kind']}/{row['bpm']:g}bpm/{row['duration']:g}s/{row['sr']}hz/{row['format']}/{profile}"
+    )
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def compare_to_baseline(rows, baseline):
+    """
+    Returns (regressions, improvements): lists of (key, expected, actual)
+    for results worse or better than their baseline status.
+    """
+    regressions, improvements = [], []
+    for row in rows:
+        for profile, t in row["tempo"].items():
+            key = baseline_key(row, profile)
+            expected = baseline.get(key, "ok")
+            if STATUS_RANK[t["status"]] > STATUS_RANK[expected]:
+                regressions.append((key, expected, t["status"]))
+            elif STATUS_RANK[t["status"]] < STATUS_RANK[expected]:
+                improvements.append((key, expected, t["status"]))
+    return regressions, improvements
+
+
+def time_stage(fn, repeat):
+    """Runs fn repeat times; returns (last result, latencies, peak RSS delta)."""
+    latencies, peak, result = [], 0, None
+    for _ in range(repeat):
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            result = fn()
+            latencies.append(time.perf_counter() - start)
+        peak = max(peak, rss.peak_delta)
+    return result, latencies, peak
+
+
+def stage_summary(latencies, peak, audio_seconds):
+    p50 = percentile(latencies, 50)
+    return {
+        "p50_s": p50,
+        "p99_s": percentile(latencies, 99),
+        "x_realtime": audio_seconds / p50 if p50 else float("inf"),
+        "peak_rss_mb": peak / 2**20,
+    }
+
+
+def warm_up():
+    # Pay numba's JIT compilation before anything is timed.
+    y = librosa.clicks(times=np.arange(0, 4, 0.5), sr=22050, length=22050 * 4)
+    librosa.beat.beat_track(y=y, sr=22050)
+
+
+def bench_fixture(kind, bpm, duration, sr, fmt, profiles, repeat, max_full_seconds, fixture_dir):
+    path = get_fixture(kind, bpm, duration, sr, fmt=fmt, fixture_dir=fixture_dir)
+    with open(path, "rb") as f:
+        data = f.read()
+    row = {"kind": kind, "bpm": bpm, "duration": duration, "sr": sr, "format": fmt, "stages": {}, "tempo": {}}
+
+    # Whole-track decode and beat tracking need the full waveform in RAM;
+    # skip them on very long fixtures (use the stream profile there).
+    if duration <= max_full_seconds:
+        (y, y_sr), latencies, peak = time_stage(lambda: decode_audio(data), repeat)
+        row["stages"]["decode"] = stage_summary(latencies, peak, duration)
+        _, latencies, peak = time_stage(lambda: librosa.beat.beat_track(y=y, sr=y_sr), repeat)
+        row["stages"]["beat"] = stage_summary(latencies, peak, duration)
+        del y
+
+    for profile in profiles:
+        if profile == "full" and duration > max_full_seconds:
+            continue
+        features, latencies, peak = time_stage(lambda: analyze_audio(data, profile), repeat)
+        row["stages"][f"analyze/{profile}"] = stage_summary(latencies, peak, duration)
+        estimate = float(features["tempo"][0])
+        row["tempo"][profile] = {"estimate": estimate, "status": tempo_status(estimate, bpm)}
+
+    calls = 10000
+    per_call = timeit.timeit(lambda: suggest_dance_style(bpm), number=calls) / calls
+    row["stages"]["suggest"] = {"p50_s": per_call, "p99_s": per_call, "x_realtime": None, "peak_rss_mb": 0.0}
+    return row
+
+
+def print_row(row):
+    title = f"{row['kind']:5s} {row['bpm']:>5g} BPM {row['duration']:>6g}s {row['sr']:>5d} Hz {row['format']}"
+    print(title)
+    for stage, s in row["stages"].items():
+        if s["x_realtime"] is None:
+            print(f"    {stage:16s} {s['p50_s'] * 1e6:9.2f} us per call")
+            continue
+        speed = f"{s['x_realtime']:8.1f}x"
+        print(
+            f"    {stage:16s} p50 {s['p50_s'] * 1000:9.2f} ms  p99 {s['p99_s'] * 1000:9.2f} ms"
+            f"  {speed} realtime  peak +{s['peak_rss_mb']:7.1f} MB"
+        )
+    for profile, t in row["tempo"].items():
+        print(f"    tempo/{profile:10s} {t['estimate']:7.2f} BPM  [{t['status']}]")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic audio.")
+    parser.add_argument("--preset", default="quick", choices=sorted(PRESETS))
+    parser.add_argument("--bpm", type=float, action="append", help="Override the preset's tempos")
+    parser.add_argument("--duration", type=float, action="append", help="Override the preset's durations (s)")
+    parser.add_argument("--sr", type=int, action="append", help="Override the preset's sample rates")
+    parser.add_argument("--kind", action="append", choices=FIXTURE_KINDS, help="Override the preset's kinds")
+    parser.add_argument("--format", default="wav", choices=("wav", "flac", "mp3"))
+    parser.add_argument("--profile", action="append", choices=sorted(ANALYSIS_PROFILES),
+                        help="Analysis profiles to run (default: full and fast)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage")
+    parser.add_argument("--max-full-seconds", type=float, default=900,
+                        help="Skip whole-track decode/beat/full stages above this duration")
+    parser.add_argument("--fixture-dir", default=None)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    parser.add_argument("--strict", action="store_true", help="Treat every octave error as a failure")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Expected tempo status per fixture")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Record this run's tempo statuses in the baseline instead of checking them")
+    args = parser.parse_args(argv)
+
+    preset = PRESETS[args.preset]
+    profiles = args.profile or ["full", "fast"]
+    warm_up()
+
+    rows = []
+    for kind in args.kind or preset["kind"]:
+        for sr in args.sr or preset["sr"]:
+            for duration in args.duration or preset["duration"]:
+                for bpm in args.bpm or preset["bpm"]:
+                    row = bench_fixture(
+                        kind, bpm, duration, sr, args.format, profiles,
+                        args.repeat, args.max_full_seconds, args.fixture_dir,
+                    )
+                    print_row(row)
+                    rows.append(row)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+    statuses = [t["status"] for row in rows for t in row["tempo"].values()]
+    print(
+        f"\n{len(rows)} fixtures, {statuses.count('ok')} tempo ok, "
+        f"{statuses.count('octave')} octave errors, {statuses.count('wrong')} wrong"
+    )
+
+    baseline = load_baseline(args.baseline)
+    if args.update_baseline:
+        baseline.update({
+            baseline_key(row, profile): t["status"] for row in rows for profile, t in row["tempo"].items()
+        })
+        with open(args.baseline, "w") as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write("\n")
+        print(f"Updated {args.baseline}")
+        return 0
+
+    regressions, improvements = compare_to_baseline(rows, baseline)
+    for key, expected, actual in regressions:
+        print(f"REGRESSION {key}: {expected} -> {actual}")
+    for key, expected, actual in improvements:
+        print(f"improved   {key}: {expected} -> {actual} (accept with --update-baseline)")
+    failures = len(regressions) + (statuses.count("octave") if args.strict else 0)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
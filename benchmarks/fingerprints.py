@@ -0,0 +1,148 @@
+"""
+Regression check for fingerprint matching (fingerprint.py).
+
+MIN_MATCHES and MIN_MATCH_FRACTION were tuned by hand, between re-encoded
+copies of a song (which must match) and different songs in a similar key and
+tempo (which must not). This renders a set of deterministic synthetic songs
+and checks both sides:
+
+  * every indexed song is found again from an MP3 with its intro trimmed, a
+    22.05 kHz resample and a FLAC with silence added in front, with the time
+    shift between the files right to within a tenth of a second
+  * songs that were never indexed match nothing
+
+For every match it prints how many landmarks lined up, so a change that
+erodes the margin shows up before it flips a result. Any wrong result makes
+the run exit with status 1.
+
+Usage (from the repository root):
+
+    python -m benchmarks.fingerprints
+    python -m benchmarks.fingerprints --songs 20 --strangers 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import zlib
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+import fingerprint
+from analysis_cache import content_hash
+from benchmarks.fixtures import DEFAULT_FIXTURE_DIR
+from fingerprint import FingerprintIndex, query_landmarks, reference_landmarks
+
+# (name, trimmed seconds, padded seconds, sample rate, format) of each copy.
+VARIANTS = (
+    ("trim.mp3", 3.37, 0.0, 44100, "mp3"),
+    ("22k.wav", 0.0, 0.0, 22050, "wav"),
+    ("pad.flac", 0.0, 7.1, 44100, "flac"),
+)
+# Largest error in the recovered time shift, in seconds.
+SHIFT_TOLERANCE = 0.1
+
+
+def render_song(seed, duration=75.0, sr=44100):
+    """
+    Renders a short synthetic song: a kick on every beat, a four-chord pad
+    and a plucked melody, at a tempo and key picked from the seed.
+    """
+    rng = np.random.default_rng(seed)
+    beat = 60.0 / rng.uniform(80, 170)
+    n = int(duration * sr)
+    y = np.zeros(n, dtype=np.float32)
+    root = rng.integers(40, 52)
+    progression = rng.integers(0, 12, size=4)
+    kick_t = np.arange(int(0.2 * sr)) / sr
+    kick = np.sin(2 * np.pi * np.cumsum(50 * (1 + 2 * np.exp(-kick_t / 0.01))) / sr) * np.exp(-kick_t / 0.08)
+    for b in range(int(duration / beat)):
+        start = int(b * beat * sr)
+        end = min(n, start + int(beat * sr))
+        t = np.arange(end - start) / sr
+        chord = progression[(b // 4) % 4]
+        for interval in (0, 4, 7):
+            y[start:end] += 0.05 * np.sin(2 * np.pi * librosa.midi_to_hz(root + chord + interval + 12) * t)
+        note = root + 24 + rng.choice([0, 2, 4, 5, 7, 9, 11, 12])
+        y[start:end] += 0.12 * np.sin(2 * np.pi * librosa.midi_to_hz(note) * t) * np.exp(-t / 0.3)
+        k = min(end - start, len(kick))
+        y[start:start + k] += 0.5 * kick[:k]
+    y += 0.005 * rng.standard_normal(n).astype(np.float32)
+    return np.clip(y, -1.0, 1.0), sr
+
+
+def get_song(seed, variant=None, fixture_dir=None):
+    """
+    Returns the path of a song (or one of its VARIANTS), rendering it first
+    if it isn't cached.
+    """
+    fixture_dir = os.path.join(fixture_dir or DEFAULT_FIXTURE_DIR, "fingerprint")
+    os.makedirs(fixture_dir, exist_ok=True)
+    name = f"song{seed}.wav" if variant is None else f"song{seed}_{variant[0]}"
+    path = os.path.join(fixture_dir, name)
+    if not os.path.exists(path):
+        y, sr = render_song(zlib.crc32(f"song{seed}".encode()))
+        fmt = "wav"
+        if variant is not None:
+            _, trim, pad, out_sr, fmt = variant
+            y = np.concatenate([np.zeros(int(pad * sr), dtype=np.float32), y[int(trim * sr):]])
+            if out_sr != sr:
+                y, sr = librosa.resample(y, orig_sr=sr, target_sr=out_sr), out_sr
+        sf.write(path, y, sr, format=fmt.upper())
+    return path
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check fingerprint matching on synthetic songs.")
+    parser.add_argument("--songs", type=int, default=10, help="Songs to index and query in other encodes")
+    parser.add_argument("--strangers", type=int, default=10, help="Songs queried without being indexed")
+    parser.add_argument("--fixture-dir", default=None)
+    args = parser.parse_args(argv)
+
+    index = FingerprintIndex(tempfile.mkdtemp())
+    names = {}
+    for seed in range(args.songs):
+        data = read(get_song(seed, fixture_dir=args.fixture_dir))
+        names[content_hash(data)] = f"song{seed}"
+        index.add(content_hash(data), *reference_landmarks(data))
+
+    queries = [
+        (f"song{seed}_{variant[0]}", f"song{seed}", variant[1] - variant[2], get_song(seed, variant, args.fixture_dir))
+        for seed in range(args.songs)
+        for variant in VARIANTS
+    ]
+    queries += [
+        (f"song{seed}.wav", None, None, get_song(seed, fixture_dir=args.fixture_dir))
+        for seed in range(args.songs, args.songs + args.strangers)
+    ]
+
+    print(f"Thresholds: MIN_MATCHES={fingerprint.MIN_MATCHES}, MIN_MATCH_FRACTION={fingerprint.MIN_MATCH_FRACTION}")
+    failures = 0
+    for name, expected, shift, path in queries:
+        hashes, frames, start = query_landmarks(read(path))
+        match = index.match(hashes, frames)
+        found = names[match["digest"]] if match else None
+        ok = found == expected
+        if ok and match:
+            # offset - start is where this file starts in the indexed one.
+            ok = abs(match["offset"] - start - shift) <= SHIFT_TOLERANCE
+        failures += not ok
+        detail = (
+            f"{found} with {match['matches']} of {len(hashes)} landmarks, shift {match['offset'] - start:+.2f}s"
+            if match else "no match"
+        )
+        print(f"  {'ok  ' if ok else 'FAIL'} {name:18s} -> {detail}")
+
+    print(f"\n{len(queries)} queries, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
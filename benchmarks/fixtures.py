@@ -0,0 +1,111 @@
+"""
+Deterministic synthetic audio fixtures with a known tempo.
+
+Two kinds of track are rendered:
+
+  * "click": a bare metronome, accented on the downbeat
+  * "loop": a sine pad with a kick on every beat, a hi-hat on the off-beats
+    and light noise, closer to real dance music
+
+Audio is rendered in one-minute chunks and written straight to disk, so even
+60-minute fixtures never need the whole waveform in memory. Files are cached
+by their parameters and only rendered once.
+"""
+import os
+import zlib
+
+import numpy as np
+import soundfile as sf
+
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixtures")
+FIXTURE_KINDS = ("click", "loop")
+
+_CHUNK_SECONDS = 60
+_SUBTYPES = {"wav": "PCM_16", "flac": "PCM_16", "mp3": "MPEG_LAYER_III"}
+
+
+def fixture_name(kind, bpm, duration, sr, fmt="wav"):
+    return f"{kind}_{bpm:g}bpm_{duration:g}s_{sr}hz.{fmt}"
+
+
+def _hit(length, sr, freq, decay, noise=False, rng=None):
+    t = np.arange(length) / sr
+    env = np.exp(-t / decay)
+    if noise:
+        return (rng.standard_normal(length) * env).astype(np.float32)
+    # Pitch drops quickly, like a kick drum.
+    phase = 2 * np.pi * np.cumsum(freq * (1 + 2 * np.exp(-t / 0.01))) / sr
+    return (np.sin(phase) * env).astype(np.float32)
+
+
+def _render_chunk(kind, bpm, start, length, sr, rng):
+    """Renders samples [start, start + length) of a fixture."""
+    out = np.zeros(length, dtype=np.float32)
+    beat = 60.0 * sr / bpm
+
+    if kind == "click":
+        click = _hit(int(0.03 * sr), sr, 1000, 0.005)
+        accent = _hit(int(0.03 * sr), sr, 1500, 0.005)
+        hits = [(0.0, click, 0.6)]
+    else:
+        t = (start + np.arange(length)) / sr
+        out += 0.08 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.sin(2 * np.pi * 277.2 * t)
+        out += 0.01 * rng.standard_normal(length).astype(np.float32)
+        kick = _hit(int(0.25 * sr), sr, 55, 0.08)
+        hat = _hit(int(0.05 * sr), sr, 0, 0.01, noise=True, rng=rng)
+        hits = [(0.0, kick, 0.9), (0.5, hat, 0.25)]
+        accent = None
+
+    # Every hit (plus its tail) that overlaps this chunk.
+    first = int(np.floor((start - sr) / beat))
+    last = int(np.ceil((start + length) / beat))
+    for n in range(max(first, 0), last + 1):
+        for offset, sound, gain in hits:
+            if kind == "click" and n % 4 == 0:
+                sound = accent
+            pos = int(round((n + offset) * beat)) - start
+            lo, hi = max(pos, 0), min(pos + len(sound), length)
+            if lo < hi:
+                out[lo:hi] += gain * sound[lo - pos:hi - pos]
+    return np.clip(out, -1.0, 1.0)
+
+
+def render_fixture(path, kind, bpm, duration, sr, seed=0):
+    """
+    Writes a fixture to path, one chunk at a time.
+    """
+    fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    rng = np.random.default_rng(seed)
+    total = int(round(duration * sr))
+    chunk = _CHUNK_SECONDS * sr
+    tmp_path = f"{path}.partial"
+    with sf.SoundFile(
+        tmp_path, "w", samplerate=sr, channels=1, format=fmt.upper(), subtype=_SUBTYPES[fmt]
+    ) as f:
+        for start in range(0, total, chunk):
+            f.write(_render_chunk(kind, bpm, start, min(chunk, total - start), sr, rng))
+    os.replace(tmp_path, path)
+
+
+def get_fixture(kind, bpm, duration, sr, fmt="wav", fixture_dir=None):
+    """
+    Returns the path of a fixture, rendering it first if it isn't cached.
+
+    Args:
+        kind: "click" or "loop".
+        bpm: Tempo of the fixture.
+        duration: Length in seconds.
+        sr: Sample rate.
+        fmt: "wav", "flac" or "mp3".
+        fixture_dir: Cache directory; defaults to benchmarks/.fixtures.
+    """
+    if kind not in FIXTURE_KINDS:
+        raise ValueError(f"Unknown fixture kind {kind!r}")
+    fixture_dir = fixture_dir or DEFAULT_FIXTURE_DIR
+    os.makedirs(fixture_dir, exist_ok=True)
+    path = os.path.join(fixture_dir, fixture_name(kind, bpm, duration, sr, fmt))
+    if not os.path.exists(path):
+        # Seeded from the parameters so every machine renders identical audio.
+        seed = zlib.crc32(fixture_name(kind, bpm, duration, sr).encode())
+        render_fixture(path, kind, bpm, duration, sr, seed=seed)
+    return path
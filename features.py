@@ -0,0 +1,268 @@
+"""
+Track descriptors derived from a single STFT.
+
+Every analysis profile computes one power spectrogram of the audio, and
+librosa's onset strength, the RMS curve used for sections and the
+descriptors below are all derived from it. The descriptors are energy,
+brightness, pulse clarity, danceability and key. No pass re-reads the
+waveform.
+
+SpectralStats keeps running sums only, so the same code works on a whole
+track, on sampled windows or block by block in the streaming profile.
+
+Descriptors are scaled to 0..1 where that makes sense, so suggestions can
+compare them against the style targets in suggestions.STYLE_TRAITS.
+
+tempo_candidates() turns the tempogram the analysis already computed into
+the tempo, its half and double time (and 3/2, 2/3) with confidences, so an
+octave error can be corrected without decoding the audio again.
+"""
+import librosa
+import numpy as np
+
+# Krumhansl-Kessler key profiles, starting at the tonic.
+_MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+_MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+PITCH_CLASSES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+KEY_NAMES = tuple(f"{p} major" for p in PITCH_CLASSES) + tuple(f"{p} minor" for p in PITCH_CLASSES)
+
+
+def _zscore(x, axis=-1):
+    x = x - x.mean(axis=axis, keepdims=True)
+    return x / (x.std(axis=axis, keepdims=True) + 1e-12)
+
+
+# All 24 key templates, one per row, standardized for correlation.
+_KEY_TEMPLATES = _zscore(np.stack(
+    [np.roll(_MAJOR_PROFILE, k) for k in range(12)] + [np.roll(_MINOR_PROFILE, k) for k in range(12)]
+))
+
+# Loudness (dBFS of the mean RMS) mapped to energy 0 and 1.
+ENERGY_DB_RANGE = (-40.0, -8.0)
+# Power-weighted spectral centroid (Hz) mapped to brightness 0 and 1, on a
+# log scale. Power weighting favors the bass, so the range sits lower than
+# for librosa's (magnitude-weighted) spectral_centroid, and lower still
+# because CENTROID_MAX_HZ leaves out the air band.
+BRIGHTNESS_HZ_RANGE = (120.0, 3000.0)
+# The centroid only counts power up to this frequency, the Nyquist limit of
+# the Fast profile's 22.05 kHz, so brightness doesn't depend on the profile's
+# sample rate.
+CENTROID_MAX_HZ = 11025.0
+# Tempo band where pulse clarity counts fully towards danceability.
+DANCE_BPM_RANGE = (90.0, 140.0)
+# Onset strength standard deviation below which the envelope is too flat to
+# carry a beat (music is typically 1 or more; a held chord is under 0.1).
+# Pulse clarity is scaled down linearly below it.
+ONSET_STD_FULL = 0.5
+
+# Multiples of the estimated tempo offered as alternatives, how far (as a
+# log ratio) from each multiple to look for tempogram support, and the
+# tempo range librosa.feature.tempo searches.
+TEMPO_RELATIVES = (1.0, 2.0, 0.5, 1.5, 2.0 / 3.0)
+TEMPO_TOLERANCE = 0.06
+TEMPO_RANGE = (30.0, 320.0)
+# Candidates with less confidence than this are dropped.
+MIN_TEMPO_CONFIDENCE = 0.01
+
+
+def frame_rms(power, n_fft):
+    """
+    Returns per-frame RMS from a one-sided Hann-window power spectrogram.
+
+    Same as librosa.feature.rms(S=...), divided by the window's mean power so
+    the level matches the time-domain RMS of the signal.
+    """
+    total = 2.0 * power.sum(axis=0) - power[0]
+    if n_fft % 2 == 0:
+        total -= power[-1]
+    return np.sqrt(np.maximum(total, 0.0) / (n_fft ** 2 * 0.375))
+
+
+def onset_envelope(power, mel_basis, sr, hop_length=512):
+    """
+    Returns librosa's default onset strength from a centered power spectrogram.
+    """
+    mel_db = librosa.power_to_db(mel_basis @ power)
+    return librosa.onset.onset_strength(S=mel_db, sr=sr, hop_length=hop_length)
+
+
+def pulse_clarity(autocorrelation, frames, tempo, sr, hop_length=512):
+    """
+    Returns how strongly the onset envelope repeats at the beat period.
+
+    This is the autocorrelation of the mean-removed onset envelope (scaled to
+    1 at lag 0) at the beat lag, scaled down for envelopes too flat to hold
+    any onsets (see ONSET_STD_FULL). It is close to 1 for a steady, punchy
+    beat and near 0 for rubato or beatless audio.
+
+    Args:
+        autocorrelation: Onset envelope autocorrelation, by lag in frames.
+        frames: Number of onset frames it was summed over.
+    """
+    if tempo <= 0 or len(autocorrelation) < 2 or autocorrelation[0] <= 0:
+        return 0.0
+    lag = int(round(60.0 * sr / (hop_length * tempo)))
+    lo, hi = max(lag - 1, 1), min(lag + 2, len(autocorrelation))
+    if lo >= hi:
+        return 0.0
+    periodicity = autocorrelation[lo:hi].max() / autocorrelation[0]
+    spread = np.sqrt(autocorrelation[0] / max(frames, 1))
+    return float(np.clip(periodicity * min(1.0, spread / ONSET_STD_FULL), 0.0, 1.0))
+
+
+def danceability(clarity, tempo):
+    """
+    Returns pulse clarity discounted for tempos outside DANCE_BPM_RANGE,
+    falling to zero an octave away from the band.
+    """
+    lo, hi = DANCE_BPM_RANGE
+    octaves_out = max(0.0, np.log2(lo / tempo), np.log2(tempo / hi)) if tempo > 0 else 1.0
+    return float(clarity * max(0.0, 1.0 - octaves_out))
+
+
+def at_tempo(descriptors, tempo):
+    """
+    Returns descriptors with the tempo-dependent ones (danceability) redone
+    for another tempo, e.g. a corrected octave.
+    """
+    return {**descriptors, "danceability": danceability(descriptors["pulse_clarity"], tempo)}
+
+
+def tempo_candidates(tempogram, tempo, sr, hop_length=512, start_bpm=120.0, std_bpm=1.0):
+    """
+    Returns the estimated tempo and its relatives (TEMPO_RELATIVES) as a
+    ranked list of {"bpm", "confidence"} dicts, most likely first.
+
+    Each candidate is scored the way librosa.feature.tempo scores tempo
+    bins, from the time-averaged tempogram weighted by a log-normal prior
+    around start_bpm, and confidences are the scores normalized to sum to 1.
+    The estimate itself scores highest, so it always comes first. A tempo
+    of 0 (no onsets, e.g. silence) has no candidates.
+
+    Args:
+        tempogram: Autocorrelation tempogram, shape (win_length, frames).
+        tempo: The tempo estimated from it, in BPM.
+    """
+    if tempo <= 0:
+        return []
+    strength = tempogram.mean(axis=-1)
+    bpms = librosa.tempo_frequencies(len(strength), sr=sr, hop_length=hop_length)
+    prior = np.exp(-0.5 * ((np.log2(bpms) - np.log2(start_bpm)) / std_bpm) ** 2)
+    score = np.log1p(1e6 * strength) + np.log(np.maximum(prior, 1e-300))
+
+    lo, hi = TEMPO_RANGE
+    candidates = []
+    for factor in TEMPO_RELATIVES:
+        bpm = tempo * factor
+        near = (np.abs(np.log(bpms / bpm)) <= TEMPO_TOLERANCE) & (bpms < hi)
+        if lo <= bpm < hi and near.any():
+            candidates.append((bpm, score[near].max()))
+    if not candidates:
+        return [{"bpm": float(tempo), "confidence": 1.0}]
+
+    # Normalize in the log domain: the scores are log-likelihood-like.
+    scores = np.array([candidate_score for _, candidate_score in candidates])
+    confidence = np.exp(scores - scores.max())
+    confidence /= confidence.sum()
+    ranked = sorted(zip(confidence, (bpm for bpm, _ in candidates)), reverse=True)
+    return [
+        {"bpm": float(bpm), "confidence": float(c)}
+        for c, bpm in ranked
+        if c >= MIN_TEMPO_CONFIDENCE
+    ]
+
+
+def estimate_key(chroma):
+    """
+    Returns (key name, correlation) for a 12-bin chroma profile.
+
+    The profile is correlated against all 24 Krumhansl-Kessler major and
+    minor templates at once.
+    """
+    scores = _KEY_TEMPLATES @ _zscore(np.asarray(chroma, dtype=float)) / 12.0
+    best = int(np.argmax(scores))
+    return KEY_NAMES[best], float(scores[best])
+
+
+class SpectralStats:
+    """
+    Accumulates spectral statistics over power spectrogram frames.
+    """
+
+    # Longest onset autocorrelation lag kept, in seconds (a 30 BPM beat).
+    MAX_LAG_SECONDS = 2.0
+
+    def __init__(self, sr, n_fft=2048, hop_length=512):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+        self._band = self.freqs <= CENTROID_MAX_HZ
+        self.chroma_basis = librosa.filters.chroma(sr=sr, n_fft=n_fft)
+        self.frames = 0
+        self.mean_square = 0.0      # running sum of per-frame RMS**2
+        self.power = 0.0            # total power up to CENTROID_MAX_HZ, over all frames
+        self.centroid = 0.0         # running sum of frequency * power
+        self.chroma = np.zeros(12)  # running sum of per-frame peak-normalized chroma
+        max_lag = int(np.ceil(self.MAX_LAG_SECONDS * sr / hop_length)) + 2
+        self.autocorrelation = np.zeros(max_lag)  # summed over onset chunks
+        self.onset_frames = 0
+
+    def add(self, power):
+        """
+        Adds power spectrogram frames of shape (1 + n_fft // 2, n) and
+        returns their RMS.
+        """
+        rms = frame_rms(power, self.n_fft)
+        self.frames += power.shape[1]
+        self.mean_square += float(np.square(rms, dtype=np.float64).sum())
+        spectrum = power[self._band].sum(axis=1, dtype=np.float64)
+        self.power += float(spectrum.sum())
+        self.centroid += float(self.freqs[self._band] @ spectrum)
+        chroma = self.chroma_basis @ power
+        self.chroma += (chroma / (chroma.max(axis=0, keepdims=True) + 1e-12)).sum(axis=1)
+        return rms
+
+    def add_onsets(self, onset_env):
+        """
+        Adds a chunk of onset strength envelope (at hop_length) to the pooled
+        autocorrelation used for pulse clarity.
+        """
+        if len(onset_env) < 2:
+            return
+        ac = librosa.autocorrelate(onset_env - onset_env.mean(), max_size=len(self.autocorrelation))
+        self.autocorrelation[:len(ac)] += ac
+        self.onset_frames += len(onset_env)
+
+    def descriptors(self, tempo):
+        """
+        Summarizes everything added so far.
+
+        Args:
+            tempo: Global tempo in BPM.
+
+        Returns:
+            A dict with "energy", "brightness", "pulse_clarity" and
+            "danceability" (all 0..1), "loudness_db", "spectral_centroid"
+            (Hz), "key" (e.g. "A minor") and "key_confidence" (-1..1).
+        """
+        loudness = 10.0 * np.log10(self.mean_square / max(self.frames, 1) + 1e-12)
+        centroid = self.centroid / self.power if self.power > 0 else 0.0
+        clarity = pulse_clarity(self.autocorrelation, self.onset_frames, tempo, self.sr, self.hop_length)
+        key, key_confidence = estimate_key(self.chroma) if self.chroma.any() else ("unknown", 0.0)
+
+        lo, hi = ENERGY_DB_RANGE
+        energy = np.clip((loudness - lo) / (hi - lo), 0.0, 1.0)
+        lo, hi = BRIGHTNESS_HZ_RANGE
+        brightness = np.clip(np.log2(max(centroid, 1.0) / lo) / np.log2(hi / lo), 0.0, 1.0)
+
+        return {
+            "energy": float(energy),
+            "loudness_db": float(loudness),
+            "brightness": float(brightness),
+            "spectral_centroid": float(centroid),
+            "pulse_clarity": clarity,
+            "danceability": danceability(clarity, tempo),
+            "key": key,
+            "key_confidence": key_confidence,
+        }
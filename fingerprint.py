@@ -0,0 +1,286 @@
+"""
+Audio fingerprints, so a song that was already analyzed is recognized even
+when it arrives as a different file (another bitrate or format, a WAV rip,
+a trimmed intro).
+
+A fingerprint is a set of spectral peak pairs ("landmarks"): two strong
+time-frequency peaks close together, hashed from their frequencies and the
+time between them, plus the time of the first peak. Codecs keep the loudest
+peaks in place, and a pair doesn't care where the file starts. So two encodes
+of a song share many hashes, all at the same time difference.
+
+Only a short excerpt of a new upload is fingerprinted (QUERY_SECONDS from
+QUERY_OFFSET in). The index holds the first REFERENCE_SECONDS of every
+analyzed track, so a query still lines up when either file has lost or gained
+some intro. FingerprintIndex keeps the hashes in SQLite, indexed by hash, and
+a lookup reads only the rows of the query's few hundred hashes. That takes
+milliseconds even with tens of thousands of tracks in the index.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import librosa
+import numpy as np
+
+from audio_io import audio_duration, decode_audio
+
+# Bump this whenever the hashes change, so old fingerprints are dropped.
+FINGERPRINT_VERSION = 1
+
+SAMPLE_RATE = 11025
+N_FFT = 1024
+HOP_LENGTH = 256
+# Peaks are only picked between these frequencies, where codecs keep the most.
+FREQ_RANGE_HZ = (100.0, 4000.0)
+# Strongest peaks kept per second of audio, and partners paired with each.
+PEAKS_PER_SECOND = 8
+FAN_OUT = 4
+# Longest time between the two peaks of a pair, in frames (6 bits, ~1.5 s).
+MAX_PAIR_FRAMES = 63
+
+QUERY_OFFSET = 15.0
+QUERY_SECONDS = 10.0
+REFERENCE_SECONDS = 60.0
+
+# A match needs this many landmarks agreeing on one time difference, and at
+# least this fraction of the query landmarks whose hash is in the index (the
+# only ones that can vote). On benchmarks/fingerprints.py, copies align 34+
+# landmarks at 0.13 and up (trimmed MP3s are the closest call; resamples
+# score ~0.9), while songs never indexed align at most 13, at 0.06 or less.
+MIN_MATCHES = 12
+MIN_MATCH_FRACTION = 0.12
+# Hashes with more landmark rows than this fraction of the indexed tracks
+# (and at least MIN_COMMON_ROWS) are ignored in lookups.
+COMMON_HASH_FRACTION = 0.01
+MIN_COMMON_ROWS = 50
+
+
+def _local_max(spec, size):
+    # Separable running maximum over a (freq, time) neighbourhood, edge-padded.
+    for axis, width in enumerate(size):
+        pad = [(0, 0), (0, 0)]
+        pad[axis] = (width // 2, width // 2)
+        windows = np.lib.stride_tricks.sliding_window_view(np.pad(spec, pad, mode="edge"), width, axis=axis)
+        spec = windows.max(axis=-1)
+    return spec
+
+
+def landmarks(y, sr=SAMPLE_RATE):
+    """
+    Returns the (hashes, frames) landmarks of a mono waveform at SAMPLE_RATE.
+
+    hashes packs the first peak's frequency bin, the second peak's frequency
+    bin and the frames between them into one integer; frames is the frame of
+    the first peak. Both are int64 arrays of the same length.
+    """
+    spec = librosa.amplitude_to_db(np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)), ref=np.max)
+    lo, hi = np.searchsorted(librosa.fft_frequencies(sr=sr, n_fft=N_FFT), FREQ_RANGE_HZ)
+    band = spec[lo:hi]
+    # Local maxima over ~160 Hz and ~0.16 s, ignoring near-silence.
+    is_peak = (band == _local_max(band, (15, 7))) & (band > -60.0)
+    bins, frames = np.nonzero(is_peak)
+    if len(frames) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    strength = band[bins, frames]
+
+    # The strongest peaks of each second, so quiet passages get landmarks too.
+    second = frames * HOP_LENGTH // sr
+    order = np.lexsort((-strength, second))
+    rank = np.arange(len(order)) - np.searchsorted(second[order], second[order])
+    keep = order[rank < PEAKS_PER_SECOND]
+    keep = keep[np.lexsort((bins[keep], frames[keep]))]
+    bins, frames = bins[keep] + lo, frames[keep]
+
+    # Pair every peak with the next FAN_OUT peaks after it.
+    hashes, anchors = [], []
+    for step in range(1, FAN_OUT + 1):
+        dt = frames[step:] - frames[:-step]
+        ok = (dt > 0) & (dt <= MAX_PAIR_FRAMES)
+        hashes.append((bins[:-step][ok] << 15) | (bins[step:][ok] << 6) | dt[ok])
+        anchors.append(frames[:-step][ok])
+    return np.concatenate(hashes).astype(np.int64), np.concatenate(anchors).astype(np.int64)
+
+
+def query_landmarks(source):
+    """
+    Fingerprints a short excerpt of an upload for FingerprintIndex.match().
+
+    Returns:
+        (hashes, frames, start): the landmarks and the excerpt's start time
+        in seconds.
+    """
+    total = audio_duration(source)
+    start = min(QUERY_OFFSET, max(0.0, total - QUERY_SECONDS)) if total else 0.0
+    y, _ = decode_audio(source, sr=SAMPLE_RATE, mono=True, offset=start, duration=QUERY_SECONDS)
+    return (*landmarks(y), start)
+
+
+def reference_landmarks(source):
+    """
+    Fingerprints the start of an upload for FingerprintIndex.add().
+    """
+    y, _ = decode_audio(source, sr=SAMPLE_RATE, mono=True, duration=REFERENCE_SECONDS)
+    return landmarks(y)
+
+
+class FingerprintIndex:
+    """
+    On-disk index from landmark hashes to the tracks they were found in.
+
+    Tracks are identified by the content digest of the audio they were
+    analyzed from (see analysis_cache.content_hash), so a match leads straight
+    to that file's cached analysis. Safe to share between threads and
+    processes, like AnalysisCache, which creates one next to its own database
+    (AnalysisCache.fingerprints).
+    """
+
+    def __init__(self, cache_dir):
+        """
+        Args:
+            cache_dir: Directory holding the SQLite database (AnalysisCache
+                passes its own).
+        """
+        self.db_path = os.path.join(cache_dir, "fingerprints.sqlite3")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != FINGERPRINT_VERSION:
+                conn.execute("DROP TABLE IF EXISTS landmarks")
+                conn.execute("DROP TABLE IF EXISTS hashes")
+                conn.execute("DROP TABLE IF EXISTS tracks")
+                conn.execute(f"PRAGMA user_version = {FINGERPRINT_VERSION}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                " id INTEGER PRIMARY KEY,"
+                " digest TEXT UNIQUE NOT NULL,"
+                " created_at REAL DEFAULT (strftime('%s', 'now')))"
+            )
+            # Clustered by hash, so a lookup reads a few contiguous pages per hash.
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS landmarks ("
+                " hash INTEGER NOT NULL,"
+                " track INTEGER NOT NULL,"
+                " frame INTEGER NOT NULL,"
+                " PRIMARY KEY (hash, track, frame)) WITHOUT ROWID"
+            )
+            # Landmark rows per hash, to skip the very common ones.
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                " hash INTEGER PRIMARY KEY,"
+                " rows INTEGER NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def __contains__(self, digest):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM tracks WHERE digest = ?", (digest,)).fetchone() is not None
+
+    def add(self, digest, hashes, frames):
+        """
+        Stores a track's reference landmarks (see reference_landmarks()).
+        Adding a digest that is already indexed does nothing.
+        """
+        pairs = np.unique(np.stack([hashes, frames], axis=1), axis=0)
+        counted, counts = np.unique(pairs[:, 0], return_counts=True)
+        with self._connect() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO tracks (digest) VALUES (?)", (digest,))
+            if cursor.rowcount == 0:
+                return
+            track = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO landmarks (hash, track, frame) VALUES (?, ?, ?)",
+                ((h, track, f) for h, f in pairs.tolist()),
+            )
+            conn.executemany(
+                "INSERT INTO hashes (hash, rows) VALUES (?, ?)"
+                " ON CONFLICT (hash) DO UPDATE SET rows = rows + excluded.rows",
+                zip(counted.tolist(), counts.tolist()),
+            )
+
+    def match(self, hashes, frames):
+        """
+        Finds the indexed track that shares the most landmarks with a query,
+        all at one time difference.
+
+        Hashes found in more than COMMON_HASH_FRACTION of the index (the
+        landmarks of a drum machine or a common chord, say) are skipped: they
+        tell tracks apart poorly and would make up most of the rows read.
+
+        Args:
+            hashes, frames: Query landmarks (see query_landmarks()).
+
+        Returns:
+            A dict with the track's "digest", the "offset" in seconds of the
+            query's first frame in that track, and "matches" (the number of
+            aligned landmarks), or None if the best track has fewer than
+            MIN_MATCHES aligned landmarks or fewer than MIN_MATCH_FRACTION of
+            the query landmarks whose hash is in the index.
+        """
+        if len(hashes) == 0:
+            return None
+        unique = np.unique(hashes).tolist()
+        rows = []
+        with self._connect() as conn:
+            tracks = conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+            max_rows = max(MIN_COMMON_ROWS, COMMON_HASH_FRACTION * tracks)
+            # Stay under SQLite's limit on bound parameters.
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows += conn.execute(
+                    "SELECT landmarks.hash, track, frame FROM hashes JOIN landmarks USING (hash)"
+                    f" WHERE hashes.hash IN ({','.join('?' * len(chunk))}) AND rows <= ?",
+                    chunk + [max_rows],
+                ).fetchall()
+            if not rows:
+                return None
+            found = np.array(rows, dtype=np.int64)
+
+            # Every (query landmark, indexed landmark) pair with the same hash
+            # votes for its track and time difference.
+            order = np.argsort(hashes, kind="stable")
+            lo = np.searchsorted(hashes[order], found[:, 0], side="left")
+            counts = np.searchsorted(hashes[order], found[:, 0], side="right") - lo
+            row = np.repeat(np.arange(len(found)), counts)
+            within = np.arange(len(row)) - np.repeat(np.cumsum(counts) - counts, counts)
+            query = order[lo[row] + within]
+            keys, votes = np.unique(
+                (found[row, 1] << 32) + found[row, 2] - frames[query], return_counts=True
+            )
+
+            # Frame boundaries differ between encodes, so votes one frame to
+            # either side count too.
+            score = votes.copy()
+            for shift in (-1, 1):
+                index = np.minimum(np.searchsorted(keys, keys + shift), len(keys) - 1)
+                score += np.where(keys[index] == keys + shift, votes[index], 0)
+            best = int(np.argmax(score))
+            # Only query landmarks whose hash is in the index could have voted.
+            usable = np.isin(hashes, found[:, 0]).sum()
+            if score[best] < max(MIN_MATCHES, MIN_MATCH_FRACTION * usable):
+                return None
+            track, offset = divmod(int(keys[best]) + (1 << 31), 1 << 32)
+            digest = conn.execute("SELECT digest FROM tracks WHERE id = ?", (track,)).fetchone()[0]
+        return {
+            "digest": digest,
+            "offset": (offset - (1 << 31)) * HOP_LENGTH / SAMPLE_RATE,
+            "matches": int(score[best]),
+        }
+
+    def clear(self):
+        """Drops every fingerprint."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM landmarks")
+            conn.execute("DELETE FROM hashes")
+            conn.execute("DELETE FROM tracks")
@@ -0,0 +1,206 @@
+"""
+Per-stage timing for the analysis pipeline.
+
+Pipeline code marks its stages with stage():
+
+    with stage("decode", nbytes=len(data)):
+        y, sr = decode(...)
+
+Stages are recorded on the Trace that is active in the current context, and
+cost next to nothing when none is. A Trace adds up wall time, CPU time, bytes
+and calls per stage name, and can optionally run cProfile over the whole
+request:
+
+    with Trace("upload", cprofile=True) as trace:
+        features = analyze_audio(data)
+    record(trace)        # Prometheus counters + one structured log line
+    print(trace.as_dict()["stages"], trace.profile_text)
+
+Analysis usually runs in a worker process, where traces and metrics of the
+parent aren't visible. traced_call() runs a function under a Trace in the
+worker and returns (result, trace dict), which the parent then passes to
+record().
+"""
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("dance_ai.timing")
+
+# Functions listed in a cProfile report.
+PROFILE_LINES = 30
+
+_current_trace = contextvars.ContextVar("dance_ai_trace", default=None)
+
+
+class Trace:
+    """
+    Collects stage timings for one request.
+
+    CPU time is process-wide (time.process_time), so it includes librosa's
+    worker threads but also anything else the process does at the same time.
+    """
+
+    def __init__(self, name="request", cprofile=False, **fields):
+        """
+        Args:
+            name: What is being traced, e.g. "upload" or "api.analyze".
+            cprofile: Run cProfile while the trace is active and keep the
+                report in profile_text.
+            **fields: Extra fields for the structured log line (job id,
+                analysis profile, ...).
+        """
+        self.name = name
+        self.fields = fields
+        self.cprofile = cprofile
+        self.profile_text = None
+        self.stages = {}
+        self.wall = 0.0
+        self.cpu = 0.0
+        self._profiler = None
+        self._token = None
+
+    def add(self, name, wall, cpu, nbytes=0):
+        """Adds one measurement to the totals of a stage."""
+        totals = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0, "bytes": 0, "calls": 0})
+        totals["wall"] += wall
+        totals["cpu"] += cpu
+        totals["bytes"] += nbytes
+        totals["calls"] += 1
+
+    def __enter__(self):
+        self._token = _current_trace.set(self)
+        self._start = (time.perf_counter(), time.process_time())
+        if self.cprofile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._profiler is not None:
+            self._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            self.profile_text = out.getvalue()
+            self._profiler = None
+        self.wall = time.perf_counter() - self._start[0]
+        self.cpu = time.process_time() - self._start[1]
+        _current_trace.reset(self._token)
+
+    def as_dict(self):
+        """Returns the trace as plain, picklable and JSON-ready data."""
+        return {
+            "name": self.name,
+            **self.fields,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "stages": self.stages,
+            "profile": self.profile_text,
+        }
+
+
+@contextmanager
+def stage(name, nbytes=0):
+    """
+    Times a pipeline stage on the active Trace, if there is one.
+
+    Yields a dict whose "bytes" entry can be updated when the amount of data
+    is only known at the end of the stage.
+    """
+    trace = _current_trace.get()
+    info = {"bytes": nbytes}
+    if trace is None:
+        yield info
+        return
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield info
+    finally:
+        trace.add(name, time.perf_counter() - wall, time.process_time() - cpu, info["bytes"])
+
+
+def traced_call(fn, *args, trace_name="analysis", cprofile=False, **kwargs):
+    """
+    Calls fn(*args, **kwargs) under a Trace and returns (result, trace dict).
+
+    Module-level so it can be submitted to a process pool.
+    """
+    with Trace(trace_name, cprofile=cprofile) as trace:
+        result = fn(*args, **kwargs)
+    return result, trace.as_dict()
+
+
+class StageMetrics:
+    """
+    Process-wide counters per trace and stage, rendered in the Prometheus
+    text exposition format.
+    """
+
+    def __init__(self):
+        self._traces = {}
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, trace):
+        """Adds a finished Trace (or trace dict) to the counters."""
+        data = trace if isinstance(trace, dict) else trace.as_dict()
+        with self._lock:
+            totals = self._traces.setdefault(data["name"], [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += data["wall"]
+            totals[2] += data["cpu"]
+            for name, stage_totals in data["stages"].items():
+                totals = self._stages.setdefault((data["name"], name), [0, 0.0, 0.0, 0])
+                totals[0] += stage_totals["calls"]
+                totals[1] += stage_totals["wall"]
+                totals[2] += stage_totals["cpu"]
+                totals[3] += stage_totals["bytes"]
+
+    def render_prometheus(self):
+        """Returns all counters as Prometheus text-format metrics."""
+        families = (
+            ("dance_ai_requests_total", "Traced requests.", self._traces, 0),
+            ("dance_ai_request_seconds_total", "Wall-clock seconds of traced requests.", self._traces, 1),
+            ("dance_ai_request_cpu_seconds_total", "CPU seconds of traced requests.", self._traces, 2),
+            ("dance_ai_stage_calls_total", "Times each pipeline stage ran.", self._stages, 0),
+            ("dance_ai_stage_seconds_total", "Wall-clock seconds per pipeline stage.", self._stages, 1),
+            ("dance_ai_stage_cpu_seconds_total", "CPU seconds per pipeline stage.", self._stages, 2),
+            ("dance_ai_stage_bytes_total", "Bytes processed per pipeline stage.", self._stages, 3),
+        )
+        lines = []
+        with self._lock:
+            for metric, help_text, series, index in families:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for key, totals in sorted(series.items()):
+                    if isinstance(key, tuple):
+                        labels = f'trace="{key[0]}",stage="{key[1]}"'
+                    else:
+                        labels = f'trace="{key}"'
+                    lines.append(f"{metric}{{{labels}}} {totals[index]}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = StageMetrics()
+
+
+def record(trace, **fields):
+    """
+    Publishes a finished trace: adds it to METRICS and logs one structured
+    (JSON) line on the "dance_ai.timing" logger.
+
+    Args:
+        trace: A Trace or a dict from Trace.as_dict() / traced_call().
+        **fields: Extra fields for the log line.
+    """
+    data = trace if isinstance(trace, dict) else trace.as_dict()
+    METRICS.observe(data)
+    if logger.isEnabledFor(logging.INFO):
+        line = {key: value for key, value in data.items() if key != "profile"}
+        logger.info(json.dumps({**line, **fields}, default=str))
@@ -0,0 +1,205 @@
+"""
+Background job queue for audio analysis.
+
+Analysis is CPU-bound, so jobs run on a shared process pool rather than in
+the Streamlit script thread. Each job gets an id that a session (or an API
+client) can poll. The queue is bounded: once max_pending jobs are queued or
+running, submit() raises QueueFull so callers can push back instead of piling
+up work the server can't finish.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Finished jobs nobody collected (e.g. the browser tab was closed) are
+# dropped after this many seconds.
+FINISHED_JOB_TTL = 600
+
+
+def _worker_context():
+    # Streamlit installs the app script as __main__, so "spawn" and
+    # "forkserver" workers would re-execute the whole page on startup. Fork
+    # where the platform allows it. The parent only hashes bytes and never
+    # runs librosa, so no thread pools are inherited mid-flight. The server's
+    # other threads (Tornado, script runs) may be mid-way through something
+    # when a worker is forked, but the child only inherits the forking
+    # thread. The only locks it shares with them are the import and logging
+    # locks, which Python re-initializes after fork. Workers are forked when
+    # the queue is created (see JobQueue._new_executor) rather than on
+    # whichever request thread happens to submit first.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+
+def _started():
+    # No-op job that makes the pool start its workers.
+    return None
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at capacity."""
+
+
+class JobQueue:
+    """
+    A bounded queue of jobs running on a shared worker pool.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, executor=None, initializer=None):
+        """
+        Args:
+            max_workers: Worker processes. Defaults to the CPU count.
+            max_pending: Maximum jobs queued or running at once. Defaults to
+                four per worker.
+            executor: An existing concurrent.futures executor to use instead
+                of creating a process pool.
+            initializer: Optional function each worker runs once at startup,
+                e.g. analysis.warm_up. The workers are started right away
+                (instead of on the first job) so it runs in the background.
+
+        If a worker dies (killed for running out of memory on a long mix,
+        say), the jobs it took down fail with BrokenProcessPool and the next
+        submit() starts a fresh pool. That only applies to the pool the queue
+        creates itself, not to an executor passed in.
+        """
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._initializer = initializer
+        self.max_pending = max_pending or 4 * self._max_workers
+        self._owns_executor = executor is None
+        self._executor = executor or self._new_executor()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _new_executor(self):
+        executor = ProcessPoolExecutor(
+            max_workers=self._max_workers, mp_context=_worker_context(), initializer=self._initializer
+        )
+        # Start the workers now, so the fork (and any warm-up) happens here.
+        for _ in range(self._max_workers):
+            executor.submit(_started)
+        return executor
+
+    def _expire(self):
+        # Caller must hold self._lock.
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job["finished_at"] is not None and now - job["finished_at"] > FINISHED_JOB_TTL:
+                del self._jobs[job_id]
+
+    def pending_count(self):
+        """Returns the number of jobs queued or running."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job["future"].done())
+
+    def submit(self, fn, *args, on_done=None, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns its job id.
+
+        Args:
+            fn: A picklable (module-level) function.
+            on_done: Optional callback called with the result in this process
+                when the job succeeds, e.g. to store it in a cache.
+
+        Raises:
+            QueueFull: If max_pending jobs are already queued or running.
+        """
+        with self._lock:
+            self._expire()
+            pending = sum(1 for job in self._jobs.values() if not job["future"].done())
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} analysis jobs are already waiting; please try again shortly.")
+
+            submitted_at = time.monotonic()
+            try:
+                future = self._executor.submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                # A worker died earlier; its jobs already failed. Replace the pool,
+                # starting the new one first so the broken pool is still there
+                # (and retried next time) if starting it fails.
+                if not self._owns_executor:
+                    raise
+                executor = self._new_executor()
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = executor
+                future = self._executor.submit(fn, *args, **kwargs)
+            # Only registered once it has a future, so a failed submit leaves
+            # nothing behind for pending_count() and status() to trip over.
+            job_id = uuid.uuid4().hex
+            job = {"future": future, "submitted_at": submitted_at, "finished_at": None}
+            self._jobs[job_id] = job
+
+        def _finished(future):
+            job["finished_at"] = time.monotonic()
+            if on_done is not None and not future.cancelled() and future.exception() is None:
+                on_done(future.result())
+
+        job["future"].add_done_callback(_finished)
+        return job_id
+
+    def status(self, job_id):
+        """
+        Returns a dict describing a job: "state" (queued, running, done,
+        failed or unknown), "elapsed" seconds since submission and "ahead",
+        the number of earlier jobs still queued or running.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return {"state": "unknown", "elapsed": 0.0, "ahead": 0}
+            ahead = sum(
+                1 for other in self._jobs.values()
+                if other["submitted_at"] < job["submitted_at"] and not other["future"].done()
+            )
+
+        future = job["future"]
+        if future.done():
+            state = "failed" if future.cancelled() or future.exception() is not None else "done"
+        elif future.running():
+            state = "running"
+        else:
+            state = "queued"
+        return {"state": state, "elapsed": time.monotonic() - job["submitted_at"], "ahead": ahead}
+
+    def future(self, job_id):
+        """
+        Returns the concurrent.futures.Future for a job, e.g. to await it with
+        asyncio.wrap_future().
+
+        Raises:
+            KeyError: If the job id is unknown or has expired.
+        """
+        with self._lock:
+            return self._jobs[job_id]["future"]
+
+    def pop_result(self, job_id):
+        """
+        Removes a finished job and returns its result, re-raising its exception
+        if it failed.
+
+        Raises:
+            KeyError: If the job id is unknown or has expired.
+            RuntimeError: If the job hasn't finished yet.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if not job["future"].done():
+                raise RuntimeError(f"Job {job_id} hasn't finished yet")
+            del self._jobs[job_id]
+        return job["future"].result()
+
+    def cancel(self, job_id):
+        """Cancels a queued job (running jobs finish) and forgets it."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job["future"].cancel()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,357 @@
+"""
+Live tempo tracking for rehearsals: a continuously updated BPM and dance
+style for an audio stream instead of an uploaded file.
+
+LiveTempoTracker turns incoming audio into onset strength one hop at a time
+(streaming.IncrementalOnset) and keeps the last few seconds of the envelope in
+a ring buffer. After every block it re-estimates the tempo from that window's
+autocorrelation, weighted by the same log-normal prior librosa.feature.tempo
+uses. Memory is fixed by the window, however long the stream runs. Audio is
+reflected in the estimate as soon as it fills an STFT frame (n_fft samples,
+about 46 ms at 44.1 kHz) plus the processing time, far below half a second.
+
+SuggestionFollower calls suggest_dance_style() only when the tempo moves onto
+another rung of the genre's BPM ladder (see suggestions.tempo_bucket), with a
+little hysteresis so a tempo sitting on a boundary doesn't flap.
+
+Live sources yield blocks of mono float32 samples and have a samplerate:
+
+  * FileSource plays an audio file back in real time, for testing offline.
+  * SocketSource reads raw 16-bit PCM from a local TCP connection, e.g. from
+    send_file() or ffmpeg.
+  * MicrophoneSource records from a sound card (needs the optional
+    sounddevice package).
+
+Usage:
+    python live.py song.wav --genre Latin/Ballroom
+    python live.py --listen 9000 --sr 44100 &
+    python live.py --send song.wav --port 9000
+    python live.py --mic
+"""
+import argparse
+import queue
+import socket
+import sys
+import time
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from streaming import IncrementalOnset
+from suggestions import GENRE_OPTIONS, suggest_dance_style, tempo_bucket
+
+
+class LiveTempoTracker:
+    """
+    Incremental tempo estimate over a sliding window of recent audio.
+    """
+
+    def __init__(self, sr, hop_length=512, n_fft=2048, window_seconds=8.0, min_seconds=4.0,
+                 start_bpm=120.0, std_bpm=1.0, tempo_range=(30.0, 320.0)):
+        """
+        Args:
+            sr: Sample rate of the pushed audio.
+            window_seconds: How much recent onset envelope the estimate uses.
+                Longer is steadier but follows tempo changes more slowly.
+            min_seconds: Audio needed before the first estimate.
+            start_bpm, std_bpm: The log-normal tempo prior, as in
+                librosa.feature.tempo.
+            tempo_range: Lowest and highest tempo considered, in BPM.
+        """
+        self.sr = sr
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.onset = IncrementalOnset(sr, n_fft=n_fft, hop_length=hop_length)
+        self._carry = np.zeros(0, dtype=np.float32)   # samples not yet in a full frame
+        self._ring = np.zeros(int(round(window_seconds * sr / hop_length)), dtype=np.float32)
+        self._pos = 0                                  # next write position in the ring
+        self._min_frames = int(round(min_seconds * sr / hop_length))
+        self.frames = 0
+
+        frame_rate = 60.0 * sr / hop_length            # BPM of a one-frame period
+        self._lags = np.arange(
+            max(1, int(np.floor(frame_rate / tempo_range[1]))),
+            min(len(self._ring) // 2, int(np.ceil(frame_rate / tempo_range[0]))) + 1,
+        )
+        self._logprior = -0.5 * ((np.log2(frame_rate / self._lags) - np.log2(start_bpm)) / std_bpm) ** 2
+        self._window = np.hanning(len(self._ring)).astype(np.float32)
+        self.tempo = None
+        self.strength = 0.0
+        # The first STFT and autocorrelation pay for lazy imports and filter
+        # construction; pay it now rather than on the first live block.
+        IncrementalOnset(sr, n_fft=n_fft, hop_length=hop_length).process(np.zeros(n_fft, dtype=np.float32))
+        librosa.autocorrelate(self._window, max_size=self._lags[-1] + 2)
+
+    @property
+    def pending_seconds(self):
+        """Audio received but not yet in the estimate (it doesn't fill a frame yet)."""
+        return len(self._carry) / self.sr
+
+    def push(self, samples):
+        """
+        Adds a block of mono samples (any length) and returns the current
+        tempo in BPM, or None until min_seconds of audio have been heard.
+        Feed hop-sized blocks for an update every hop.
+        """
+        y = np.concatenate([self._carry, np.asarray(samples, dtype=np.float32)])
+        n_frames = (len(y) - self.n_fft) // self.hop_length + 1 if len(y) >= self.n_fft else 0
+        if n_frames <= 0:
+            self._carry = y
+            return self.tempo
+        self._append(self.onset.process(y[:(n_frames - 1) * self.hop_length + self.n_fft]))
+        # Keep the overlap the next frame needs, and whatever didn't fit.
+        self._carry = y[n_frames * self.hop_length:]
+        if self.frames >= self._min_frames:
+            self._estimate()
+        return self.tempo
+
+    def _append(self, env):
+        size = len(self._ring)
+        env = env[-size:]
+        index = (self._pos + np.arange(len(env))) % size
+        self._ring[index] = env
+        self._pos = (self._pos + len(env)) % size
+        self.frames += len(env)
+
+    def _estimate(self):
+        # Oldest to newest; until the ring has wrapped, only what was written.
+        if self.frames >= len(self._ring):
+            env = np.roll(self._ring, -self._pos)
+            window = self._window
+        else:
+            env = self._ring[:self.frames]
+            window = np.hanning(len(env))
+        ac = librosa.autocorrelate(env * window, max_size=self._lags[-1] + 2)
+        if ac[0] <= 0:
+            return
+        ac /= ac[0]
+        # Scored like librosa.feature.tempo: log autocorrelation plus prior.
+        score = np.log1p(1e6 * np.maximum(ac[self._lags], 0.0)) + self._logprior
+        best = int(np.argmax(score))
+        lag = float(self._lags[best])
+        if 0 < best < len(score) - 1:
+            # A parabola through the peak refines the lag between frames.
+            left, mid, right = score[best - 1:best + 2]
+            curvature = left - 2 * mid + right
+            if curvature < 0:
+                lag += 0.5 * (left - right) / curvature
+        self.tempo = float(60.0 * self.sr / (self.hop_length * lag))
+        self.strength = float(ac[self._lags[best]])
+
+
+class SuggestionFollower:
+    """
+    Keeps the dance style suggestion for a changing tempo, calling
+    suggest_dance_style() only when the tempo moves to another BPM bucket.
+    """
+
+    def __init__(self, selected_genre=GENRE_OPTIONS[0], hysteresis=0.02):
+        """
+        Args:
+            hysteresis: How far past a bucket boundary (as a fraction of the
+                tempo) the tempo has to be before the bucket changes. The
+                first tempo picks its bucket straight away.
+        """
+        self.selected_genre = selected_genre
+        self.hysteresis = hysteresis
+        self.bucket = None
+        self.suggestion = None
+        self.calls = 0
+
+    def update(self, tempo):
+        """
+        Returns the new suggestion if the tempo moved to another bucket,
+        otherwise None.
+        """
+        if tempo is None:
+            return None
+        bucket = tempo_bucket(tempo, self.selected_genre)
+        if bucket == self.bucket:
+            return None
+        if self.bucket is not None:
+            # Only move once the tempo is clearly past the boundary it crossed.
+            margin = 1 + self.hysteresis
+            past = tempo / margin if bucket > self.bucket else tempo * margin
+            if tempo_bucket(past, self.selected_genre) != bucket:
+                return None
+        self.bucket = bucket
+        self.suggestion = suggest_dance_style(tempo, self.selected_genre)
+        self.calls += 1
+        return self.suggestion
+
+
+def track_live(source, selected_genre=GENRE_OPTIONS[0], **tracker_options):
+    """
+    Tracks tempo and suggestions on a live source, yielding one update per
+    block.
+
+    Args:
+        source: A live source (FileSource, SocketSource, MicrophoneSource or
+            anything with a samplerate that yields mono float32 blocks).
+        selected_genre: The genre to suggest for.
+        **tracker_options: Passed to LiveTempoTracker.
+
+    Yields:
+        Dicts with "time" (seconds of audio so far), "tempo" (BPM, or None
+        while warming up), "strength" (autocorrelation at the beat period,
+        0..1), "latency" (seconds from a block arriving until the estimate
+        covers it, including audio still waiting to fill a frame) and
+        "suggestion" (the new suggestion when the bucket changed, else None).
+    """
+    tracker = LiveTempoTracker(source.samplerate, **tracker_options)
+    follower = SuggestionFollower(selected_genre)
+    heard = 0
+    for block in source:
+        arrived = time.perf_counter()
+        tempo = tracker.push(block)
+        heard += len(block)
+        yield {
+            "time": heard / source.samplerate,
+            "tempo": tempo,
+            "strength": tracker.strength,
+            "latency": time.perf_counter() - arrived + tracker.pending_seconds,
+            "suggestion": follower.update(tempo),
+        }
+
+
+class FileSource:
+    """
+    Plays an audio file as if it were live, one block at a time.
+    """
+
+    def __init__(self, path, block_size=512, realtime=True):
+        """
+        Args:
+            realtime: Wait for each block's playback time before yielding it.
+                With False, blocks come as fast as they can be read.
+        """
+        self.path = path
+        self.block_size = block_size
+        self.realtime = realtime
+        self.samplerate = sf.info(path).samplerate
+
+    def __iter__(self):
+        start = time.perf_counter()
+        played = 0
+        with sf.SoundFile(self.path) as f:
+            for block in f.blocks(blocksize=self.block_size, dtype="float32", always_2d=True):
+                played += len(block)
+                if self.realtime:
+                    time.sleep(max(0.0, start + played / self.samplerate - time.perf_counter()))
+                yield block.mean(axis=1)
+
+
+class SocketSource:
+    """
+    Accepts one TCP connection and reads raw 16-bit little-endian PCM from it
+    until it closes. The sender decides the pace, so a live feed (or
+    send_file()) arrives in real time.
+    """
+
+    def __init__(self, port, samplerate=44100, channels=1, host="127.0.0.1", block_size=512):
+        self.port = port
+        self.samplerate = samplerate
+        self.channels = channels
+        self.host = host
+        self.block_size = block_size
+
+    def __iter__(self):
+        frame_bytes = 2 * self.channels
+        with socket.create_server((self.host, self.port)) as server:
+            conn, _ = server.accept()
+            with conn:
+                pending = b""
+                while True:
+                    data = conn.recv(self.block_size * frame_bytes)
+                    if not data:
+                        break
+                    pending += data
+                    usable = len(pending) - len(pending) % frame_bytes
+                    if usable:
+                        pcm = np.frombuffer(pending[:usable], dtype="<i2").reshape(-1, self.channels)
+                        pending = pending[usable:]
+                        yield pcm.mean(axis=1, dtype=np.float32) / 32768.0
+
+
+class MicrophoneSource:
+    """
+    Records from a sound card input. Needs the sounddevice package, which is
+    not installed by default (pip install sounddevice).
+    """
+
+    def __init__(self, samplerate=44100, block_size=512, device=None):
+        self.samplerate = samplerate
+        self.block_size = block_size
+        self.device = device
+
+    def __iter__(self):
+        try:
+            import sounddevice
+        except ImportError:
+            raise RuntimeError("Microphone input needs the sounddevice package: pip install sounddevice")
+        blocks = queue.Queue()
+        with sounddevice.InputStream(
+            samplerate=self.samplerate,
+            blocksize=self.block_size,
+            device=self.device,
+            channels=1,
+            dtype="float32",
+            callback=lambda indata, frames, when, status: blocks.put(indata[:, 0].copy()),
+        ):
+            while True:
+                yield blocks.get()
+
+
+def send_file(path, port, host="127.0.0.1", block_size=512):
+    """
+    Streams an audio file to a SocketSource as 16-bit PCM, in real time.
+    """
+    source = FileSource(path, block_size=block_size)
+    with socket.create_connection((host, port)) as conn:
+        for block in source:
+            conn.sendall((np.clip(block, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Track the tempo of live audio and suggest dance styles.")
+    parser.add_argument("path", nargs="?", help="Audio file to play back as a live source")
+    parser.add_argument("--listen", type=int, metavar="PORT", help="Read 16-bit PCM from a TCP connection")
+    parser.add_argument("--mic", action="store_true", help="Record from the default microphone")
+    parser.add_argument("--send", metavar="PATH", help="Stream an audio file to --port in real time and exit")
+    parser.add_argument("--port", type=int, default=9000, help="Port for --send")
+    parser.add_argument("--sr", type=int, default=44100, help="Sample rate for --listen and --mic")
+    parser.add_argument("--channels", type=int, default=1, help="Channels for --listen")
+    parser.add_argument("--genre", default=GENRE_OPTIONS[0], choices=GENRE_OPTIONS)
+    parser.add_argument("--fast", action="store_true", help="Play the file as fast as possible, not in real time")
+    parser.add_argument("--every", type=float, default=1.0, help="Seconds between tempo lines")
+    args = parser.parse_args(argv)
+
+    if args.send:
+        send_file(args.send, args.port)
+        return 0
+    if args.listen:
+        source = SocketSource(args.listen, samplerate=args.sr, channels=args.channels)
+    elif args.mic:
+        source = MicrophoneSource(samplerate=args.sr)
+    elif args.path:
+        source = FileSource(args.path, realtime=not args.fast)
+    else:
+        parser.error("give a file to play, --listen PORT or --mic")
+
+    next_line = 0.0
+    worst_latency = 0.0
+    for update in track_live(source, args.genre):
+        worst_latency = max(worst_latency, update["latency"])
+        if update["suggestion"] is not None:
+            print(f"{update['time']:7.1f}s  {update['tempo']:6.1f} BPM  -> {update['suggestion']['style']}", flush=True)
+            next_line = update["time"] + args.every
+        elif update["tempo"] is not None and update["time"] >= next_line:
+            print(f"{update['time']:7.1f}s  {update['tempo']:6.1f} BPM", flush=True)
+            next_line += args.every
+    print(f"Worst latency: {worst_latency * 1000:.0f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
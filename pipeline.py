@@ -0,0 +1,79 @@
+"""
+The analysis + suggestion pipeline as a plain library, for use outside the
+Streamlit page (batch jobs, the HTTP API, notebooks).
+
+    from pipeline import run_pipeline
+    with open("song.mp3", "rb") as f:
+        result = run_pipeline(f.read(), genre="Latin/Ballroom", profile="fast")
+    print(result["tempo"], result["suggestion"]["style"])
+"""
+import numpy as np
+
+from analysis import analyze_with_cache, with_tempo
+from suggestions import rank_styles, suggest_dance_style, suggest_for_sections
+
+
+def to_jsonable(obj):
+    """
+    Recursively converts analysis results into plain JSON types: NumPy arrays
+    become lists, NumPy scalars become numbers and read-only mappings become dicts.
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, "items"):
+        return {key: to_jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(value) for value in obj]
+    return obj
+
+
+def describe(features, genre="Auto-Detect (BPM only)", tempo=None):
+    """
+    Builds the full, JSON-ready response for analyzed features.
+
+    Args:
+        features: A dict returned by analysis.analyze_audio().
+        genre: The genre to suggest for.
+        tempo: BPM to suggest for, e.g. one of the features'
+            "tempo_candidates"; defaults to the analyzed global tempo.
+            Section tempos and descriptors follow it (see
+            analysis.with_tempo()).
+
+    Returns:
+        A dict with "tempo", "genre", "features", "suggestion", "ranking"
+        (catalog entries with their scores, best first; empty without
+        descriptors) and "sections" (each section with its own "suggestion").
+    """
+    if tempo is not None:
+        features = with_tempo(features, tempo)
+    tempo = float(features["tempo"][0])
+    descriptors = features.get("descriptors")
+    sections = [
+        {**section, "suggestion": suggestion}
+        for section, suggestion in suggest_for_sections(features.get("sections", []), genre, descriptors)
+    ]
+    return to_jsonable({
+        "tempo": tempo,
+        "genre": genre,
+        "features": features,
+        "suggestion": suggest_dance_style(tempo, genre, descriptors),
+        "ranking": rank_styles(tempo, descriptors, genre) if descriptors else [],
+        "sections": sections,
+    })
+
+
+def run_pipeline(source, genre="Auto-Detect (BPM only)", profile="full", cache=None, **overrides):
+    """
+    Analyzes audio and returns suggestions for it, as describe() does.
+
+    Args:
+        source: Audio bytes, a bytes-like object or a BytesIO/UploadedFile.
+        genre: The genre to suggest for.
+        profile: Analysis profile name (see analysis.ANALYSIS_PROFILES).
+        cache: Optional AnalysisCache.
+        **overrides: Profile settings to override.
+    """
+    features = analyze_with_cache(source, cache, profile, **overrides)
+    return describe(features, genre)
@@ -0,0 +1,160 @@
+"""
+Bounded-memory tempo analysis for long mixes.
+
+Instead of decoding a whole track into one array, audio is read from the
+upload in fixed-size blocks with soundfile. Each block is turned into onset
+strength frames (the same log-mel spectral flux librosa's onset_strength
+computes) and then dropped. The onset envelope is cut into segments and each
+segment gets its own tempo estimate. Their tempograms are summed into a
+running total that gives the global tempo. Peak memory depends on the block
+and segment sizes, not on the length of the track, so a 90-minute DJ set
+costs about as much RAM as a 3-minute song.
+"""
+import librosa
+import numpy as np
+import soundfile as sf
+
+from audio_io import open_reader
+from features import SpectralStats, tempo_candidates
+from instrumentation import stage
+
+
+class IncrementalOnset:
+    """
+    Computes an onset strength envelope one block of audio at a time.
+
+    Blocks must be consecutive and overlap by n_fft - hop_length samples (as
+    produced by soundfile's blocks() or librosa.stream), so the STFT frames
+    line up exactly with a single pass over the whole signal.
+    """
+
+    def __init__(self, sr, n_fft=2048, hop_length=512, n_mels=128, stats=None):
+        """
+        Args:
+            stats: Optional features.SpectralStats that every block's power
+                spectrogram is added to.
+        """
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+        self.stats = stats
+        self._prev = None
+
+    def process(self, y):
+        """
+        Returns the onset strength frames contributed by one block of mono audio.
+        """
+        if len(y) < self.n_fft:
+            return np.zeros(0, dtype=np.float32)
+        S = np.abs(librosa.stft(y, n_fft=self.n_fft, hop_length=self.hop_length, center=False)) ** 2
+        if self.stats is not None:
+            self.stats.add(S)
+        # No top_db here: clipping relative to a per-block peak would make the
+        # envelope depend on where block boundaries fall.
+        S = librosa.power_to_db(self.mel_basis @ S, top_db=None)
+
+        if self._prev is None:
+            # Uncentered frame i lines up with librosa's centered frame
+            # i + n_fft // (2 * hop), and onset_strength delays its output by
+            # that much again, so pad the same total up front.
+            lead = np.zeros(self.n_fft // self.hop_length, dtype=np.float32)
+            prev = S[:, :1]
+        else:
+            lead = np.zeros(0, dtype=np.float32)
+            prev = self._prev
+        flux = np.diff(np.concatenate([prev, S], axis=1), axis=1)
+        self._prev = S[:, -1:]
+        env = np.maximum(0.0, flux).mean(axis=0).astype(np.float32)
+        return np.concatenate([lead, env])
+
+
+def stream_tempo(source, segment_duration=30.0, block_frames=256, hop_length=512, n_fft=2048):
+    """
+    Estimates global and per-segment tempo while reading audio in blocks.
+
+    Args:
+        source: A Streamlit UploadedFile / BytesIO, or a bytes-like object, in
+            a format libsndfile can read.
+        segment_duration: Length in seconds of each tempo-over-time segment.
+        block_frames: STFT frames decoded per block; sets the decode buffer size.
+        hop_length: STFT hop, in samples.
+        n_fft: STFT window, in samples.
+
+    Returns:
+        A dict with "tempo" (global BPM, array of shape (1,)),
+        "tempo_candidates" (see features.tempo_candidates), "descriptors"
+        (see features.SpectralStats.descriptors), plus
+        "segment_times" and "segment_tempos": the start time in seconds and
+        the tempo of each segment.
+    """
+    try:
+        f = sf.SoundFile(open_reader(source))
+    except sf.SoundFileRuntimeError as e:
+        raise ValueError(f"Streaming analysis needs a format libsndfile can read: {e}") from e
+
+    with f:
+        sr = f.samplerate
+        stats = SpectralStats(sr, n_fft=n_fft, hop_length=hop_length)
+        onset = IncrementalOnset(sr, n_fft=n_fft, hop_length=hop_length, stats=stats)
+        segment_frames = max(1, int(round(segment_duration * sr / hop_length)))
+
+        pending = []          # onset frames not yet assigned to a finished segment
+        pending_len = 0
+        tg_total = None       # running sum of tempogram columns
+        tg_count = 0
+        segment_times, segment_tempos = [], []
+        frames_done = 0
+        heard_onsets = False  # silence has no tempo, only the prior's peak
+
+        def finish_segment(env):
+            nonlocal tg_total, tg_count, frames_done, heard_onsets
+            with stage("tempogram"):
+                tg = librosa.feature.tempogram(onset_envelope=env, sr=sr, hop_length=hop_length)
+                segment_tempo = librosa.feature.tempo(tg=tg, sr=sr, hop_length=hop_length)[0] if env.any() else 0.0
+            heard_onsets = heard_onsets or env.any()
+            segment_times.append(frames_done * hop_length / sr)
+            segment_tempos.append(float(segment_tempo))
+            stats.add_onsets(env)
+            tg_sum = tg.sum(axis=1)
+            tg_total = tg_sum if tg_total is None else tg_total + tg_sum
+            tg_count += tg.shape[1]
+            frames_done += len(env)
+
+        blocks = f.blocks(
+            blocksize=n_fft + (block_frames - 1) * hop_length,
+            overlap=n_fft - hop_length,
+            dtype="float32",
+            always_2d=True,
+        )
+        while True:
+            # Decoding happens inside the blocks generator; pull from it
+            # explicitly so it can be timed apart from the onset work.
+            with stage("decode") as info:
+                block = next(blocks, None)
+                info["bytes"] = block.nbytes if block is not None else 0
+            if block is None:
+                break
+            with stage("onset", block.nbytes):
+                pending.append(onset.process(block.mean(axis=1)))
+            pending_len += len(pending[-1])
+            while pending_len >= segment_frames:
+                env = np.concatenate(pending)
+                finish_segment(env[:segment_frames])
+                pending = [env[segment_frames:]]
+                pending_len = len(pending[0])
+
+        # A short tail still counts, as long as it can hold a couple of beats.
+        if pending_len * hop_length / sr >= 2.0 or tg_total is None:
+            # Audio shorter than one frame leaves only empty onset chunks.
+            finish_segment(np.concatenate(pending) if pending_len else np.zeros(1, dtype=np.float32))
+
+    tempogram = (tg_total / tg_count)[:, np.newaxis]
+    tempo = librosa.feature.tempo(tg=tempogram, sr=sr, hop_length=hop_length) if heard_onsets else np.zeros(1)
+    return {
+        "tempo": tempo,
+        "tempo_candidates": tempo_candidates(tempogram, float(tempo[0]), sr, hop_length),
+        "descriptors": stats.descriptors(float(tempo[0])),
+        "segment_times": np.asarray(segment_times),
+        "segment_tempos": np.asarray(segment_tempos),
+    }
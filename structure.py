@@ -0,0 +1,113 @@
+"""
+Tempo-over-time and section segmentation from beat tracking output.
+
+Everything here reuses the beat frames that beat tracking already produced,
+plus a frame-wise RMS curve taken from the analysis's shared STFT (see
+features.frame_rms), so it adds no extra STFT or onset pass. Each function is a handful of vectorized NumPy
+operations over per-beat arrays.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+SECTION_LABELS = ("intro", "verse", "drop", "outro")
+
+
+def _moving(values, width, reducer):
+    # Centered moving reduction with edge padding, so output length == input.
+    if len(values) == 0 or width <= 1:
+        return values.astype(float)
+    width = min(width, len(values))
+    left = (width - 1) // 2
+    padded = np.pad(values.astype(float), (left, width - 1 - left), mode="edge")
+    return reducer(sliding_window_view(padded, width), axis=-1)
+
+
+def local_tempo_curve(beat_times, smooth_beats=8):
+    """
+    Returns (times, bpm) for the tempo between consecutive beats.
+
+    Inter-beat intervals are converted to BPM and median-smoothed over
+    smooth_beats beats, so one missed or doubled beat doesn't spike the curve.
+    Times are the midpoints between beats.
+    """
+    beat_times = np.asarray(beat_times, dtype=float)
+    if len(beat_times) < 2:
+        return np.zeros(0), np.zeros(0)
+    intervals = np.diff(beat_times)
+    bpm = _moving(60.0 / intervals, smooth_beats, np.median)
+    return beat_times[:-1] + intervals / 2, bpm
+
+
+def segment_sections(energy_env, beats, beat_times, duration, phrase_beats=16):
+    """
+    Splits a track into intro / verse / drop / outro sections.
+
+    Frame energy is averaged per beat and then per phrase (phrase_beats
+    beats, four bars of 4/4 by default). Phrases in the top quarter of
+    energy (and clearly above average) are "drop"s. Quieter-than-median
+    phrases at the very start and end are "intro" and "outro". Everything
+    else is "verse". Consecutive phrases with the same label are merged.
+
+    Args:
+        energy_env: Frame-wise energy (e.g. RMS), on the same frame grid as beats.
+        beats: Beat positions, in frames.
+        beat_times: Beat positions, in seconds.
+        duration: Track (or excerpt) length in seconds.
+        phrase_beats: Beats per phrase.
+
+    Returns:
+        A list of dicts with "label", "start", "end" (seconds), "tempo" (BPM)
+        and "energy" (mean energy relative to the track average).
+    """
+    beats = np.asarray(beats, dtype=int)
+    beat_times = np.asarray(beat_times, dtype=float)
+    if len(beats) < 2:
+        return []
+
+    # Mean energy between consecutive beats, via one cumulative sum.
+    edges = np.minimum(np.concatenate([beats, [len(energy_env)]]), len(energy_env))
+    csum = np.concatenate([[0.0], np.cumsum(energy_env, dtype=float)])
+    span = np.maximum(edges[1:] - edges[:-1], 1)
+    beat_energy = (csum[edges[1:]] - csum[edges[:-1]]) / span
+
+    # Per-phrase energy and tempo (last phrase may be short).
+    phrase_idx = np.arange(len(beats)) // phrase_beats
+    n_phrases = phrase_idx[-1] + 1
+    counts = np.bincount(phrase_idx, minlength=n_phrases)
+    energy = np.bincount(phrase_idx, weights=beat_energy, minlength=n_phrases) / counts
+    energy = energy / (energy.mean() or 1.0)
+
+    starts = beat_times[::phrase_beats].copy()
+    # The first beat rarely falls at 0 s (silence or a pickup before it).
+    # Start phrase one at the top so the sections cover the whole track.
+    starts[0] = 0.0
+    ends = np.append(starts[1:], duration)
+    # Each phrase's tempo comes from its own first and last beat.
+    last_beat = np.minimum(np.arange(n_phrases) * phrase_beats + counts - 1, len(beat_times) - 1)
+    first_beat = np.arange(n_phrases) * phrase_beats
+    beat_span = np.maximum(last_beat - first_beat, 1)
+    tempo = 60.0 * beat_span / np.maximum(beat_times[last_beat] - beat_times[first_beat], 1e-6)
+    # Single-beat phrases have no interval of their own; borrow the global tempo.
+    tempo = np.where(last_beat > first_beat, tempo, 60.0 / np.median(np.diff(beat_times)))
+
+    labels = np.full(n_phrases, "verse", dtype=object)
+    # The 10% margins keep a track with flat dynamics from being split on noise.
+    labels[(energy >= np.quantile(energy, 0.75)) & (energy > 1.1)] = "drop"
+    quiet = (energy < np.median(energy)) & (energy < 0.9)
+    # Leading and trailing runs of quiet phrases.
+    labels[np.cumprod(quiet).astype(bool)] = "intro"
+    labels[np.cumprod(quiet[::-1])[::-1].astype(bool) & (labels != "intro")] = "outro"
+
+    # Merge runs of equal labels into sections.
+    boundaries = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+    sections = []
+    for lo, hi in zip(np.r_[0, boundaries], np.r_[boundaries, n_phrases]):
+        weights = counts[lo:hi]
+        sections.append({
+            "label": labels[lo],
+            "start": float(starts[lo]),
+            "end": float(ends[hi - 1]),
+            "tempo": float(np.average(tempo[lo:hi], weights=weights)),
+            "energy": float(np.average(energy[lo:hi], weights=weights)),
+        })
+    return sections
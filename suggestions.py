@@ -0,0 +1,423 @@
+"""
+Dance style, routine and costume suggestions for a song's tempo and genre.
+
+The catalog below is frozen once at import: every entry's response payload
+(including its Google/YouTube search links) is built up front, and the BPM
+ladders are stored as sorted boundary tuples searched with bisect. That makes
+suggest_dance_style() an allocation-free O(log n) lookup, which matters when
+it's called thousands of times from batch reports and the API.
+
+When analysis descriptors (energy, danceability, brightness; see features.py)
+are available, entries are instead ranked by how well the song matches each
+style's STYLE_TRAITS, scored for all candidates at once with NumPy.
+"""
+from bisect import bisect_right
+from types import MappingProxyType
+
+import numpy as np
+
+from features import ENERGY_DB_RANGE
+
+# Genres offered to the user; "Auto-Detect (BPM only)" picks purely by tempo.
+GENRE_OPTIONS = (
+    "Auto-Detect (BPM only)", "Classical", "Ballet", "Contemporary/Lyrical", "Jazz/Broadway", "Tap",
+    "Hip-Hop/R&B", "Afrobeat/Dancehall", "Breaking/B-Boying", "Electronic/Pop", "Latin/Ballroom", "Soca",
+)
+
+# A set of highly stable, general beginner tutorial links for embedding
+# and corresponding search queries for more dynamic results.
+GENRE_DATA = {
+    "Classical": {
+        "embedded_video": "https://www.youtube.com/watch?v=sKq2u-gY1gU", # Classical piece, elegant
+        "search_queries": [
+            "classical dance techniques tutorial",
+            "classical ballet choreography slow",
+            "lyrical classical music dance"
+        ],
+        "style": "Timeless Classical music invites elegant and flowing movements. 🎻",
+        "routine": "Focus on controlled, expressive movements and musicality. Think orchestral grandiosity translated into graceful motion.",
+        "costume": "Formal and sophisticated attire, suitable for orchestral or traditional classical performance.",
+        "costume_shop_link": "https://www.amazon.com/s?k=classical+orchestra+concert+wear",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=classical%20music%20performance%20attire"
+    },
+    "Ballet": {
+        "embedded_video": "https://www.youtube.com/watch?v=2r15822t1bY", # Beginner Ballet barre
+        "search_queries": [
+            "basic ballet steps tutorial",
+            "ballet warm up exercises",
+            "beginner ballet class"
+        ],
+        "style": "Graceful and precise Ballet. 🩰",
+        "routine": "Emphasize turnout, pointed feet, and ethereal quality. Focus on pliés, relevés, and elegant arm lines. Suitable for both classical and neoclassical styles.",
+        "costume": "Traditional ballet attire: leotard, tights, ballet shoes (pointe shoes if applicable). Often pastel colors or classic black/white.",
+        "costume_shop_link": "https://www.amazon.com/s?k=ballet+dance+wear",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=ballet%20costumes%20traditional"
+    },
+    "Contemporary/Lyrical": {
+        "embedded_video": "https://www.youtube.com/watch?v=x7K4B5o1Y_Q", # Lyrical dance routine
+        "search_queries": [
+            "contemporary dance beginner tutorial",
+            "lyrical dance floor work",
+            "expressive contemporary choreography"
+        ],
+        "style": "Fluid and expressive Contemporary or Lyrical dance. ✨",
+        "routine": "Explore floor work, emotional storytelling, and dynamic shifts. Focus on connection to the music's lyrics and underlying emotions.",
+        "costume": "Soft, flowing fabrics, often stretchable. Think leotards, tights, dresses, or two-piece sets that allow full range of motion.",
+        "costume_shop_link": "https://www.amazon.com/s?k=contemporary+lyrical+dance+costumes",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=contemporary%20lyrical%20dance%20wear%20flowy"
+    },
+    "Jazz/Broadway": {
+        "embedded_video": "https://www.youtube.com/watch?v=i-vjFmS-M9Q", # Jazz dance routine
+        "search_queries": [
+            "jazz dance steps tutorial",
+            "broadway jazz choreography",
+            "theatrical dance moves"
+        ],
+        "style": "Energetic Jazz or theatrical Broadway dance. 🎭",
+        "routine": "Incorporate sharp isolations, high kicks, pirouettes, and expressive gestures. Focus on showmanship and musicality for performance.",
+        "costume": "Flashy and form-fitting, often with sequins, bold colors, or a theatrical flair. Jazz shoes or character shoes are common.",
+        "costume_shop_link": "https://www.amazon.com/s?k=jazz+broadway+dance+costumes",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=jazz%20dance%20costumes%20theatrical"
+    },
+    "Tap": {
+        "embedded_video": "https://www.youtube.com/watch?v=33hLwT23F7E", # Tap dance tutorial
+        "search_queries": [
+            "beginner tap dance steps",
+            "tap dance rhythm exercises",
+            "easy tap choreography"
+        ],
+        "style": "Rhythmic and percussive Tap dance. 🎵",
+        "routine": "Focus on clear sounds, intricate footwork patterns, and rhythmic improvisation. Your feet become the percussion!",
+        "costume": "Comfortable and often vintage-inspired attire that allows for clear sound. Tap shoes are essential.",
+        "costume_shop_link": "https://www.amazon.com/s?k=tap+dance+costumes",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=tap%20dance%20outfits%20rhythmic"
+    },
+    "Hip-Hop/R&B": {
+        "embedded_video": "https://www.youtube.com/watch?v=YRDa_0NO2U4", # Hip-hop Routine
+        "search_queries": [
+            "beginner hip hop dance moves",
+            "r&b dance choreography",
+            "groove dance tutorial"
+        ],
+        "style": "Groove-based Hip-Hop or R&B. 🕺",
+        "routine": "Incorporate smooth body rolls, sharp isolations, and rhythmic footwork. Practice 'bounce' techniques and hitting the beat with attitude.",
+        "costume": "Comfortable and stylish streetwear! Think joggers, a cool hoodie, baggy jeans, a t-shirt, and fresh sneakers.",
+        "costume_shop_link": "https://www.amazon.com/s?k=hip+hop+dance+outfits",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=hip%20hop%20dance%20outfits%20streetwear"
+    },
+    "Afrobeat/Dancehall": {
+        "embedded_video": "https://www.youtube.com/watch?v=20F_g_R9e7U", # Afrobeat/Dancehall tutorial
+        "search_queries": [
+            "afrobeat dance steps",
+            "dancehall queen moves tutorial",
+            "energetic afro dance"
+        ],
+        "style": "Vibrant and energetic Afrobeat or Dancehall. 🔥",
+        "routine": "Focus on rhythmic isolations, powerful waist movements (wining), and expressive footwork. Emphasize ground connection and infectious energy.",
+        "costume": "Colorful, comfortable, and often free-flowing attire that allows for dynamic movement. Bold patterns and accessories are common.",
+        "costume_shop_link": "https://www.amazon.com/s?k=afrobeat+dance+wear",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=afrobeat%20dancehall%20costumes%20vibrant"
+    },
+    "Breaking/B-Boying": {
+        "embedded_video": "https://www.youtube.com/watch?v=WJt4oK8_R9o", # Basic B-Boying moves
+        "search_queries": [
+            "breaking top rock tutorial",
+            "b-boy footwork for beginners",
+            "power moves breaking tutorial"
+        ],
+        "style": "Dynamic and acrobatic Breaking/B-Boying. 💥",
+        "routine": "Incorporate top rock, footwork, power moves (spins, freezes), and creative transitions. Focus on strength, flexibility, and unique style.",
+        "costume": "Durable, comfortable sportswear, often including tracksuits, t-shirts, and sneakers, built for intense floor work and dynamic moves.",
+        "costume_shop_link": "https://www.amazon.com/s?k=b+boying+breaking+dance+wear",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=breaking%20b-boying%20outfits"
+    },
+    "Electronic/Pop": {
+        "embedded_video": "https://www.youtube.com/watch?v=kruB90MMCeg", # House/Pop/Freestyle Routine
+        "search_queries": [
+            "pop dance choreography tutorial",
+            "easy electronic dance moves",
+            "freestyle dance upbeat music"
+        ],
+        "style": "Upbeat House, Pop, or a fun Freestyle! 💃",
+        "routine": "Use quick, energetic footwork, dynamic arm movements, and expressive gestures. Try incorporating spins, jumps, and lots of big, expressive motions.",
+        "costume": "Something colorful and fun! Bright workout gear, a vibrant jacket, or anything that makes you feel confident and ready to move with the beat.",
+        "costume_shop_link": "https://www.amazon.com/s?k=colorful+pop+dance+outfits",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=electronic%20pop%20dance%20costumes%20vibrant"
+    },
+    "Latin/Ballroom_Slow": { # For Latin/Ballroom below 120 BPM
+        "embedded_video": "https://www.youtube.com/watch?v=sO7tV2p2q0s", # Latin Ballroom (Cha Cha)
+        "search_queries": [
+            "beginner rumba dance tutorial",
+            "slow cha cha steps",
+            "tango basics for beginners"
+        ],
+        "style": "Smooth and passionate Latin/Ballroom dances (e.g., Rumba, Cha-Cha, Tango). 🌹",
+        "routine": "Focus on partner connection, precise footwork, and expressive body movements. Emphasize leading and following, with clear rhythm and dramatic flair.",
+        "costume": "Elegant and flowing formal dancewear, often with sparkle and movement, suitable for partner dancing, emphasizing fluidity.",
+        "costume_shop_link": "https://www.amazon.com/s?k=latin+ballroom+dance+dresses",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=latin%20ballroom%20dance%20costumes%20elegant"
+    },
+    "Latin/Ballroom_Fast": { # For Latin/Ballroom 120+ BPM
+        "embedded_video": "https://www.youtube.com/watch?v=X5Q9W_xV104", # Fast Latin (Salsa)
+        "search_queries": [
+            "salsa dance steps beginner",
+            "jive basic steps tutorial",
+            "quickstep dance tutorial"
+        ],
+        "style": "Energetic and lively Latin/Ballroom styles (e.g., Salsa, Jive, Quickstep). 🔥",
+        "routine": "Incorporate fast turns, energetic steps, and dynamic partner work. Focus on speed, precision, and maintaining a high energy level with vibrant expression.",
+        "costume": "Vibrant and free-moving dancewear, designed for fast-paced and expressive partner routines, often with bold colors and embellishments.",
+        "costume_shop_link": "https://www.amazon.com/s?k=salsa+jive+dance+wear",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=energetic%20latin%20dance%20outfits"
+    },
+    "Soca": {
+        "embedded_video": "https://www.youtube.com/watch?v=EUIPhTlOZ9Q", # Soca Dance Moves Tutorial
+        "search_queries": [
+            "soca dance tutorial for beginners",
+            "wining dance steps",
+            "carnival dance moves"
+        ],
+        "style": "High-energy and rhythmic Soca, perfect for carnival and celebrations! 🌴",
+        "routine": "Focus on fluid waist movements (wining), rhythmic footwork, and energetic body isolations. Let the infectious beat guide your every move!",
+        "costume": "Bright, vibrant, and often minimal attire designed for hot climates and vigorous movement, embracing bold colors and Caribbean flair.",
+        "costume_shop_link": "https://www.amazon.com/s?k=soca+carnival+outfits",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=soca%20carnival%20costumes%20vibrant"
+    },
+    "Auto-Detect_Slow": { # BPM < 80
+        "embedded_video": "https://www.youtube.com/watch?v=P2WFzDW0Iag", # General Contemporary Routine (slow)
+        "search_queries": [
+            "slow graceful dance tutorial",
+            "fluid movement choreography",
+            "meditative dance moves"
+        ],
+        "style": "Slow and graceful movements, like a waltz or general Contemporary. 🎶",
+        "routine": "Focus on fluid, slow transitions and emotional expression. Think long, flowing lines and soft gestures.",
+        "costume": "Elegant and light, like a flowing dress or form-fitting attire. Something that moves beautifully with you!",
+        "costume_shop_link": "https://www.amazon.com/s?k=graceful+dance+costumes",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=elegant%20dance%20costumes"
+    },
+    "Auto-Detect_Mid": { # 80 <= BPM < 120
+        "embedded_video": "https://www.youtube.com/watch?v=I43yG_uFqXo", # Basic Groove Dance Moves for Beginners
+        "search_queries": [
+            "easy groove dance tutorial",
+            "beginner r&b dance steps",
+            "casual hip hop dance"
+        ],
+        "style": "A good tempo for general Groove-based dances. 🕺",
+        "routine": "Incorporate smooth body rolls, footwork, and isolations. Practice some simple 'bounce' techniques to stay on beat.",
+        "costume": "Comfortable and stylish streetwear! Think joggers, a cool hoodie, or a t-shirt and sneakers.",
+        "costume_shop_link": "https://www.amazon.com/s?k=casual+dance+wear",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=street%20dance%20outfits"
+    },
+    "Auto-Detect_Upbeat": { # 120 <= BPM < 150
+        "embedded_video": "https://www.youtube.com/watch?v=Lqj-4K6q9nE", # Easy Cardio Dance Workout - No Equipment
+        "search_queries": [
+            "upbeat pop dance tutorial",
+            "freestyle dance ideas",
+            "high energy dance workout"
+        ],
+        "style": "This upbeat tempo is perfect for general high-energy styles like Pop or Freestyle! 💃",
+        "routine": "Use quick, energetic footwork and arm movements. Try to incorporate spins, jumps, and lots of big, expressive motions.",
+        "costume": "Something colorful and fun! Bright workout gear, a fun jacket, or anything that makes you feel confident and ready to move.",
+        "costume_shop_link": "https://www.amazon.com/s?k=upbeat+dance+costumes",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=energetic%20dance%20outfits"
+    },
+    "Auto-Detect_Fast": { # BPM >= 150
+        "embedded_video": "https://www.youtube.com/watch?v=khvSXG0UYzM", # Energetic Dance Routine
+        "search_queries": [
+            "fast cardio dance workout",
+            "club dance moves tutorial",
+            "high tempo dance choreography"
+        ],
+        "style": "Fast-paced and highly energetic dances, such as intense Cardio or Club styles. ⚡️",
+        "routine": "The focus is on speed and stamina. Practice quick steps, high knees, and sharp, impactful movements.",
+        "costume": "Breathable and functional athletic wear. Shorts, a tank top, and supportive shoes are a must!",
+        "costume_shop_link": "https://www.amazon.com/s?k=athletic+dance+wear",
+        "costume_look_link": "https://www.pinterest.com/search/pins/?q=workout%20dance%20outfits"
+    }
+}
+
+# Genres whose entry depends on tempo: (BPM boundaries, entry names). Entry i
+# covers boundaries[i-1] <= BPM < boundaries[i].
+TEMPO_LADDERS = {
+    "Auto-Detect (BPM only)": (
+        (80, 120, 150),
+        ("Auto-Detect_Slow", "Auto-Detect_Mid", "Auto-Detect_Upbeat", "Auto-Detect_Fast"),
+    ),
+    "Latin/Ballroom": (
+        (120,),
+        ("Latin/Ballroom_Slow", "Latin/Ballroom_Fast"),
+    ),
+}
+
+# Used if a selected genre isn't found (shouldn't happen with GENRE_OPTIONS).
+DEFAULT_ENTRY = "Auto-Detect_Mid"
+
+# What each style sounds like: a comfortable BPM range, then target energy,
+# danceability and brightness on the 0..1 scales of features.py. The
+# Auto-Detect entries are tempo buckets only, used when there are no
+# descriptors to score.
+STYLE_TRAITS = {
+    "Classical": {"bpm": (50, 120), "energy": 0.3, "danceability": 0.2, "brightness": 0.4},
+    "Ballet": {"bpm": (60, 130), "energy": 0.35, "danceability": 0.35, "brightness": 0.5},
+    "Contemporary/Lyrical": {"bpm": (60, 110), "energy": 0.4, "danceability": 0.35, "brightness": 0.4},
+    "Jazz/Broadway": {"bpm": (110, 180), "energy": 0.65, "danceability": 0.6, "brightness": 0.6},
+    "Tap": {"bpm": (90, 150), "energy": 0.55, "danceability": 0.7, "brightness": 0.7},
+    "Hip-Hop/R&B": {"bpm": (80, 110), "energy": 0.65, "danceability": 0.85, "brightness": 0.45},
+    "Afrobeat/Dancehall": {"bpm": (95, 125), "energy": 0.7, "danceability": 0.9, "brightness": 0.5},
+    "Breaking/B-Boying": {"bpm": (105, 135), "energy": 0.8, "danceability": 0.75, "brightness": 0.55},
+    "Electronic/Pop": {"bpm": (115, 135), "energy": 0.8, "danceability": 0.85, "brightness": 0.6},
+    "Latin/Ballroom_Slow": {"bpm": (80, 120), "energy": 0.5, "danceability": 0.6, "brightness": 0.5},
+    "Latin/Ballroom_Fast": {"bpm": (120, 180), "energy": 0.7, "danceability": 0.7, "brightness": 0.6},
+    "Soca": {"bpm": (140, 170), "energy": 0.85, "danceability": 0.85, "brightness": 0.65},
+}
+
+# Score weights. A tempo an octave outside a style's range costs as much as
+# being off by 0.75 on all three descriptors.
+TEMPO_WEIGHT = 2.0
+TRAIT_WEIGHTS = {"energy": 1.0, "danceability": 1.0, "brightness": 0.5}
+
+
+def _search_link(query):
+    return f"https://www.google.com/search?q={query.replace(' ', '+')}+youtube+tutorial&tbm=vid"
+
+
+def _build_payload(data_block):
+    # For routine video links, always use the embedded one, and generate
+    # Google Search links for YouTube for additional routine ideas.
+    return MappingProxyType({
+        "style": data_block["style"],
+        "routine": data_block["routine"],
+        "costume": data_block["costume"],
+        "costume_shop_link": data_block["costume_shop_link"],
+        "costume_look_link": data_block["costume_look_link"],
+        "embedded_video_link": data_block["embedded_video"],
+        "other_video_links": tuple(_search_link(q) for q in data_block["search_queries"]),
+    })
+
+
+# Entry name -> read-only suggestion payload.
+CATALOG = MappingProxyType({name: _build_payload(block) for name, block in GENRE_DATA.items()})
+
+# Selectable genre -> (boundaries, payloads). Plain genres are a ladder with a
+# single rung, so every lookup takes the same path.
+_LADDERS = MappingProxyType({
+    **{name: ((), (payload,)) for name, payload in CATALOG.items()},
+    **{
+        genre: (tuple(boundaries), tuple(CATALOG[name] for name in names))
+        for genre, (boundaries, names) in TEMPO_LADDERS.items()
+    },
+})
+_DEFAULT_LADDER = ((), (CATALOG[DEFAULT_ENTRY],))
+
+# Styles in STYLE_TRAITS order, with their traits as arrays for vectorized scoring.
+_SCORED_NAMES = tuple(STYLE_TRAITS)
+_BPM_RANGES = np.log2([STYLE_TRAITS[name]["bpm"] for name in _SCORED_NAMES])
+_TRAIT_TARGETS = np.array([[STYLE_TRAITS[name][t] for t in TRAIT_WEIGHTS] for name in _SCORED_NAMES])
+_TRAIT_WEIGHTS = np.array(list(TRAIT_WEIGHTS.values()))
+
+# Selectable genre -> indices into _SCORED_NAMES it may choose from.
+# Auto-Detect ranks every style; a laddered genre ranks its own rungs.
+_CANDIDATES = MappingProxyType({
+    "Auto-Detect (BPM only)": np.arange(len(_SCORED_NAMES)),
+    **{name: np.array([_SCORED_NAMES.index(name)]) for name in _SCORED_NAMES},
+    **{
+        genre: np.array([_SCORED_NAMES.index(name) for name in names])
+        for genre, (_, names) in TEMPO_LADDERS.items()
+        if genre != "Auto-Detect (BPM only)"
+    },
+})
+
+
+def rank_styles(tempo, descriptors, selected_genre="Auto-Detect (BPM only)"):
+    """
+    Ranks the catalog entries a genre may use by how well they fit a song.
+
+    Each entry's score is minus its weighted distance from the song: octaves
+    outside the entry's BPM range plus the gaps between the song's
+    descriptors and the entry's targets.
+
+    Args:
+        tempo: Tempo in BPM.
+        descriptors: A descriptors dict from analysis ("energy",
+            "danceability", "brightness", ...).
+        selected_genre: The genre chosen by the user.
+
+    Returns:
+        A list of (entry name, score) pairs, best first. Empty for an unknown genre.
+    """
+    candidates = _CANDIDATES.get(selected_genre)
+    if candidates is None or tempo <= 0:
+        return []
+    log_tempo = np.log2(tempo)
+    octaves_out = np.maximum(
+        0.0, np.maximum(_BPM_RANGES[candidates, 0] - log_tempo, log_tempo - _BPM_RANGES[candidates, 1])
+    )
+    song = np.array([descriptors[t] for t in TRAIT_WEIGHTS])
+    gaps = np.abs(_TRAIT_TARGETS[candidates] - song) @ _TRAIT_WEIGHTS
+    scores = -(TEMPO_WEIGHT * octaves_out + gaps)
+    order = np.argsort(-scores, kind="stable")
+    return [(_SCORED_NAMES[candidates[i]], float(scores[i])) for i in order]
+
+
+def suggest_dance_style(tempo, selected_genre="Auto-Detect (BPM only)", descriptors=None):
+    """
+    Suggests a dance style, routine, and costume based on the tempo (BPM) and selected genre.
+    Uses a primary embedded video and Google Search (YouTube) links for more options.
+
+    With analysis descriptors, the best entry by rank_styles() is used, so
+    Auto-Detect can pick any style. Without them, the genre's BPM ladder is.
+
+    Returns a read-only mapping shared between calls; copy it with dict() if
+    you need to modify it.
+    """
+    if descriptors:
+        ranked = rank_styles(tempo, descriptors, selected_genre)
+        if ranked:
+            return CATALOG[ranked[0][0]]
+    boundaries, payloads = _LADDERS.get(selected_genre, _DEFAULT_LADDER)
+    return payloads[bisect_right(boundaries, tempo)]
+
+
+def tempo_bucket(tempo, selected_genre="Auto-Detect (BPM only)"):
+    """
+    Returns which rung of the genre's BPM ladder a tempo falls on (always 0
+    for genres without one). Without descriptors, suggest_dance_style() gives
+    the same suggestion for every tempo on a rung.
+    """
+    boundaries, _ = _LADDERS.get(selected_genre, _DEFAULT_LADDER)
+    return bisect_right(boundaries, tempo)
+
+
+def suggest_for_sections(sections, selected_genre="Auto-Detect (BPM only)", descriptors=None):
+    """
+    Runs suggest_dance_style on each section of a song using that section's tempo,
+    so a song that speeds up or slows down can change style part-way through.
+
+    Args:
+        sections: Section dicts as returned in analysis results ("label",
+            "start", "end", "tempo", "energy", ...).
+        selected_genre: The genre chosen by the user.
+        descriptors: Optional song-wide descriptors. Each section's energy
+            is shifted by its loudness relative to the whole song, on the
+            same dB scale as features.ENERGY_DB_RANGE.
+
+    Returns:
+        A list of (section, suggestion) pairs in song order.
+    """
+    if not descriptors:
+        return [(section, suggest_dance_style(section["tempo"], selected_genre)) for section in sections]
+    lo, hi = ENERGY_DB_RANGE
+    suggestions = []
+    for section in sections:
+        # Song energy is a dBFS level mapped to 0..1, while section energy is a
+        # linear RMS ratio to the song's mean, so add the ratio in dB.
+        ratio = max(section.get("energy", 1.0), 1e-6)
+        energy = descriptors["energy"] + 20.0 * np.log10(ratio) / (hi - lo)
+        suggestions.append((
+            section,
+            suggest_dance_style(
+                section["tempo"], selected_genre, {**descriptors, "energy": float(np.clip(energy, 0.0, 1.0))}
+            ),
+        ))
+    return suggestions